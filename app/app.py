@@ -6,6 +6,7 @@ from datetime import datetime
 
 from flask import Flask, render_template
 from lib.decorator import connect
+from lib.summary import SUMMARY_SIZE, best_per_route
 
 app = Flask(__name__)
 
@@ -14,22 +15,18 @@ app = Flask(__name__)
 @connect('MONGO')
 def dashboard(client):
 
-    flight_count = client.scraping.flights.find({}).count()
+    summary = client.scraping.runSummaries.find_one(
+        {}, sort=[('timePulled', -1)])
 
-    cheap_flights = list(client.scraping.flights.find(
-        {'price': {'$ne': None}}).sort([
-            ('timePulled', -1), ('price', 1)]).limit(15))
-
-    best_deals = list(client.scraping.flights.find(
-        {'price': {'$ne': None}}).sort([
-            ('timePulled', -1), ('pricePerMile', 1)]).limit(15))
-
-    last_run = list(
-        client.scraping.flights.find({}).sort(
-            'timePulled', -1).limit(1))[0]['timePulled']
-
-    all_flights = list(client.scraping.flights.find({
-        'price': {'$ne': None}, 'timePulled': last_run}))
+    if summary:
+        flight_count = summary['flightCount']
+        cheap_flights = summary['cheapFlights']
+        best_deals = summary['bestDeals']
+        all_flights = summary['mapPoints']
+        last_run = summary['timePulled']
+    else:
+        flight_count, cheap_flights, best_deals, all_flights, last_run = (
+            live_dashboard(client))
 
     seconds_since_last_run = (datetime.now() - last_run).total_seconds()
     hours, remainder = divmod(seconds_since_last_run, 3600)
@@ -51,6 +48,36 @@ def dashboard(client):
     )
 
 
+def live_dashboard(client):
+    '''
+        Queries the flights collection directly, used until the
+        first run summary has been written
+    '''
+
+    flight_count = client.scraping.flights.count_documents({})
+
+    cheap_flights = best_per_route(
+        client.scraping.flights, {'price': {'$type': 'number'}},
+        [('timePulled', -1), ('price', 1)], SUMMARY_SIZE)
+
+    best_deals = best_per_route(
+        client.scraping.flights, {'pricePerMile': {'$type': 'number'}},
+        [('timePulled', -1), ('pricePerMile', 1)], SUMMARY_SIZE)
+
+    last_run = list(
+        client.scraping.flights.find({}).sort(
+            'timePulled', -1).limit(1))[0]['timePulled']
+
+    all_flights = list(client.scraping.flights.find({
+        'price': {'$type': 'number'}, 'timePulled': last_run,
+        'rank': {'$in': [1, None]}}))
+
+    return flight_count, cheap_flights, best_deals, all_flights, last_run
+
+
 if __name__ == '__main__':
 
+    from lib.indexes import ensure_indexes
+
+    ensure_indexes()
     app.run(host='0.0.0.0', port=3000, debug=True)
\ No newline at end of file
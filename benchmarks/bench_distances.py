@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+'''
+    Benchmarks the NumPy distance functions in lib.geo against the
+    scalar math haversine called once per pair
+
+    Steps:
+        -Generate random coordinates, some of them missing
+        -Check the vectorized distances match the scalar ones
+        -Time pairwise distances for a batch of routes
+        -Time all-pairs distances between every airport
+
+    Usage:
+        $python -m benchmarks.bench_distances [airports]
+
+'''
+
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+from lib import geo
+
+
+def scalar_haversine(pointa, pointb, miles=False):
+    '''
+        The original per pair implementation
+    '''
+
+    x, y, a, b = pointa[0], pointa[1], pointb[0], pointb[1]
+
+    if x is None or y is None or a is None or b is None:
+        return None
+
+    radius = 3959 if miles else 6371
+
+    lat = math.radians(a - x)
+    lon = math.radians(b - y)
+    a = math.sin(lat / 2)**2 + math.cos(
+        math.radians(x)) * math.cos(math.radians(a)) * math.sin(lon / 2)**2
+
+    return radius * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def random_points(count, missing=0.01, seed=0):
+    '''
+        [latitude, longitude] points, a share of them without a location
+    '''
+
+    rng = random.Random(seed)
+
+    return [
+        [None, None] if rng.random() < missing else
+        [rng.uniform(-90, 90), rng.uniform(-180, 180)]
+        for _ in range(count)
+    ]
+
+
+def timed(function, *args, **kwargs):
+
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start_time
+
+
+def main(airports=2000):
+
+    points = random_points(airports)
+    routes = random_points(airports * 100, seed=1)
+    origins = routes
+    destinations = routes[1:] + routes[:1]
+
+    expected, scalar_time = timed(lambda: [
+        scalar_haversine(i, j, miles=True)
+        for i, j in zip(origins, destinations)])
+    result, vector_time = timed(
+        geo.distances, origins, destinations, miles=True)
+
+    expected = np.array(expected, dtype=np.float64)
+
+    if not np.allclose(expected, result, equal_nan=True):
+        raise Exception('Vectorized distances disagree with scalar ones')
+
+    # Coordinates already held in arrays skip the list conversion
+    origin_array = np.array(origins, dtype=np.float64)
+    destination_array = np.array(destinations, dtype=np.float64)
+    _, array_time = timed(
+        geo.distances, origin_array, destination_array, miles=True)
+
+    print('{number} routes'.format(number=len(origins)))
+    print('{name:>12}: {seconds:.4f}s'.format(
+        name='scalar', seconds=scalar_time))
+    print('{name:>12}: {seconds:.4f}s  {speedup:.0f}x'.format(
+        name='vectorized', seconds=vector_time,
+        speedup=scalar_time / vector_time))
+    print('{name:>12}: {seconds:.4f}s  {speedup:.0f}x'.format(
+        name='arrays', seconds=array_time,
+        speedup=scalar_time / array_time))
+
+    _, scalar_time = timed(lambda: [
+        [scalar_haversine(i, j) for j in points] for i in points])
+    matrix, vector_time = timed(
+        geo.pairwise_distances, points, dtype=np.float32)
+
+    print('{number}x{number} all pairs'.format(number=len(points)))
+    print('{name:>12}: {seconds:.4f}s'.format(
+        name='scalar', seconds=scalar_time))
+    print('{name:>12}: {seconds:.4f}s  {speedup:.0f}x  {size:.1f} MB'.format(
+        name='vectorized', seconds=vector_time,
+        speedup=scalar_time / vector_time, size=matrix.nbytes / 2 ** 20))
+
+
+if __name__ == '__main__':
+
+    main(*[int(i) for i in sys.argv[1:2]])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+'''
+    Benchmarks the flight listing extractor backends against the
+    full page BeautifulSoup parse the scraper used to do
+
+    The pages in benchmarks/fixtures are synthetic, written by
+    benchmarks.make_fixtures rather than recorded from expedia.
+    Most of the region cut speedup measured on them comes from
+    their script and nav padding, which is larger than on a real
+    page, so the numbers only compare backends with each other
+
+    Steps:
+        -Load the synthetic result pages in benchmarks/fixtures
+        -Check every backend extracts the same fields
+        -Time each backend and print pages per second
+
+    Usage:
+        $python -m benchmarks.bench_extractors [iterations]
+
+'''
+
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from classes import expedia
+from lib.extractors import BACKENDS, listingExtractor, load_backend
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixtures():
+    '''
+        Reads every HTML page in the fixtures directory
+    '''
+
+    pages = {}
+
+    for name in sorted(os.listdir(FIXTURES)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES, name), 'rb') as page:
+                pages[name] = page.read().decode('latin-1')
+
+    return pages
+
+
+def full_soup_extract(html):
+    '''
+        The original approach, a full page tree and a find per field
+    '''
+
+    soup = BeautifulSoup(html, 'html.parser')
+    container = soup.find('ul', {'id': 'flightModuleList'})
+
+    if container is None:
+        return []
+
+    flight = container.find_all(
+        'li', {'class': 'flight-module segment offer-listing'})[0]
+
+    values = {}
+
+    for test_id, tag in expedia.FLIGHT_FIELDS.items():
+        element = flight.find(tag, {'data-test-id': test_id})
+        if element is not None:
+            values[test_id] = element.text.strip()
+
+    stops = flight.find('span', {'data-test-num-stops': True})
+    if stops is not None:
+        values['data-test-num-stops'] = stops.get('data-test-num-stops')
+
+    return [values]
+
+
+def time_extract(extract, pages, iterations):
+
+    start_time = time.perf_counter()
+
+    for _ in range(iterations):
+        for html in pages.values():
+            extract(html)
+
+    elapsed = time.perf_counter() - start_time
+
+    return (iterations * len(pages)) / elapsed
+
+
+def main(iterations=20):
+
+    pages = load_fixtures()
+    baseline = {name: full_soup_extract(html) for name, html in pages.items()}
+
+    candidates = {'full-soup': full_soup_extract}
+
+    for backend in BACKENDS:
+        if load_backend(backend) != backend:
+            print('{backend:>12}: not installed'.format(backend=backend))
+            continue
+
+        extractor = listingExtractor(
+            region_tag='ul',
+            region_id='flightModuleList',
+            listing_tag='li',
+            listing_class='flight-module segment offer-listing',
+            fields=expedia.FLIGHT_FIELDS,
+            attributes=('data-test-num-stops',),
+            backend=backend
+        )
+
+        for name, html in pages.items():
+            if extractor.extract(html)[:1] != baseline[name]:
+                raise Exception(
+                    '{backend} disagrees with full-soup on {name}'
+                    .format(backend=backend, name=name))
+
+        candidates[backend] = extractor.extract
+
+    base_rate = None
+
+    for name, extract in candidates.items():
+
+        rate = time_extract(extract, pages, iterations)
+        base_rate = base_rate or rate
+
+        print('{name:>12}: {rate:8.1f} pages/s  {speedup:5.1f}x'.format(
+            name=name, rate=rate, speedup=rate / base_rate))
+
+
+if __name__ == '__main__':
+
+    main(*[int(i) for i in sys.argv[1:2]])
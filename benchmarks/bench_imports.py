@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+'''
+    Benchmarks how long the entry point modules take to import
+
+    Steps:
+        -Import each module in a fresh interpreter with -X importtime
+        -Repeat and keep the fastest run to drop disk cache noise
+        -Print the import time and the heaviest packages it pulled in
+
+    Usage:
+        $python -m benchmarks.bench_imports [repeats]
+
+'''
+
+import os
+import subprocess
+import sys
+
+MODULES = (
+    'configs.config',
+    'lib.decorator',
+    'lib.utils',
+    'lib.indexes',
+    'classes.scraper',
+    'classes.expedia',
+    'app.app',
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    '''
+        Imports module in a new interpreter
+
+    Returns:
+        (total microseconds, {package: cumulative microseconds}) for
+        the packages the module imports directly, None if the import
+        fails
+    '''
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=ROOT, capture_output=True, text=True)
+
+    if process.returncode:
+        return None
+
+    output = process.stderr
+
+    packages = {}
+
+    for line in output.splitlines():
+
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        if not cumulative.strip().isdigit():
+            continue
+
+        # Imports are listed after everything they import. A module
+        # imported at the top level is indented by one space and
+        # what it imports directly by three
+        if not name.startswith('  '):
+            if name.strip() == module:
+                return int(cumulative), packages
+            packages = {}
+        elif not name.startswith('    '):
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+
+    return None
+
+
+def main(repeats=5):
+
+    for module in MODULES:
+
+        runs = [import_times(module) for _ in range(repeats)]
+
+        if None in runs:
+            print('{module:>16}: import failed'.format(module=module))
+            continue
+
+        total, packages = min(runs, key=lambda i: i[0])
+
+        heaviest = sorted(packages.items(), key=lambda i: -i[1])[:3]
+
+        print('{module:>16}: {total:7.1f} ms  {heaviest}'.format(
+            module=module,
+            total=total / 1000,
+            heaviest=', '.join(
+                '{name} {ms:.0f} ms'.format(name=name, ms=us / 1000)
+                for name, us in heaviest)))
+
+
+if __name__ == '__main__':
+
+    main(*[int(i) for i in sys.argv[1:2]])
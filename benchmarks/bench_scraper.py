@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+'''
+    Benchmarks the scraper offline, with the synthetic expedia pages
+    of benchmarks/fixtures served by a local fake expedia and mongo
+    replaced by mongomock or a local server
+
+    Steps:
+        -Start fake expedia ports standing in for the proxies, with
+         the requested latency and failure rates
+        -Point mongo at mongomock, or at the server given by --mongo
+        -Seed airports and the proxy list
+        -Time extract_flights on the synthetic pages
+        -Time mongoWriter inserting flight documents
+        -Time expediaScraper.scrape_flights end to end
+        -Append the numbers to the history file, outside the repo
+         unless --history says otherwise, and print how they changed
+         since the last run with the same options
+
+    Usage:
+        $python -m benchmarks.bench_scraper
+        $python -m benchmarks.bench_scraper --airports 200 --latency 0.2
+        $python -m benchmarks.bench_scraper --mongo mongodb://localhost
+
+    --mongo needs a throwaway server, the benchmark clears its
+    airports and scraping databases
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fake_expedia import fakeExpedia, load_pages
+from configs.config import Configs
+from lib import decorator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(
+    os.path.expanduser('~'), '.cache', 'airtime', 'benchmarks',
+    'history.jsonl')
+
+# Collections cleared before each run, on mongomock or --mongo
+COLLECTIONS = (
+    ('airports', 'airportCodes'),
+    ('scraping', 'flights'),
+    ('scraping', 'flightsBenchmark'),
+    ('scraping', 'proxyIps'),
+    ('scraping', 'proxyStats'),
+    ('scraping', 'runs'),
+    ('scraping', 'runUrls'),
+    ('scraping', 'runStats'),
+)
+
+
+def use_mongo(uri=None):
+    '''
+        Makes every @connect('MONGO') call of this process use a
+        local server, or an in-memory mongomock client if no uri
+        is given
+    '''
+
+    if uri:
+        Configs.mongo_uri = uri
+        return decorator.get_client('MONGO')
+
+    try:
+        import mongomock
+    except ImportError:
+        raise Exception(
+            'mongomock is needed for the in-memory benchmark, '
+            'install it or pass --mongo')
+
+    client = mongomock.MongoClient()
+    _check_bulk_write(client)
+
+    decorator._clients['MONGO'] = (os.getpid(), client)
+
+    return client
+
+
+def _check_bulk_write(client):
+
+    from mongomock.collection import Collection
+    from pymongo import UpdateOne
+
+    try:
+        client.benchmark.bulkWrite.bulk_write([
+            UpdateOne({'_id': 0}, {'$set': {'checked': True}}, upsert=True)
+        ])
+        return
+    except TypeError:
+        pass
+
+    # mongomock releases older than the installed pymongo cannot
+    # read its UpdateOne operations, the only kind the scraper sends
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        for request in requests:
+            self.update_one(
+                request._filter, request._doc, upsert=request._upsert)
+
+    Collection.bulk_write = bulk_write
+
+
+def seed(client, airports, proxies):
+    '''
+        Clears the benchmark collections and saves random airports
+        and the fake proxies
+
+    Returns:
+        List of airport codes
+    '''
+
+    for db, collection in COLLECTIONS:
+        client[db][collection].delete_many({})
+
+    rng = random.Random(0)
+    codes = ['B{index:03d}'.format(index=i) for i in range(airports)]
+
+    client.airports.airportCodes.insert_many([
+        {
+            '_id': code,
+            'code': code,
+            'city': 'City ' + code,
+            'country': 'US',
+            'airportName': 'Airport ' + code,
+            'latitude': rng.uniform(25, 49),
+            'longitude': rng.uniform(-124, -67)
+        }
+        for code in codes
+    ])
+
+    client.scraping.proxyIps.insert_one(
+        {'_id': 'proxyIps', 'ipList': list(proxies)})
+
+    return codes
+
+
+def configure(args, directory):
+    '''
+        Settings for an offline run, the waits meant for real sites
+        and proxies would only add idle time against the fake ones
+    '''
+
+    Configs.cache_ttl = 0
+    Configs.fetch_rate_limit = args.rate_limit
+    Configs.retry_base_delay = args.retry_delay
+    Configs.retry_max_delay = args.retry_delay * 8
+    Configs.proxy_quarantine = args.retry_delay
+    Configs.proxy_max_quarantine = args.retry_delay * 8
+    Configs.distance_matrix_dir = directory
+    Configs.metrics_prometheus_path = ''
+
+
+def bench_parse(iterations):
+    '''
+        Pages and listings extract_flights gets through per second
+    '''
+
+    from classes.expedia import extract_flights
+
+    pages = load_pages()
+    listings = 0
+
+    start_time = time.perf_counter()
+
+    for _ in range(iterations):
+        for body in pages:
+            listings += len(extract_flights('', body))
+
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'pagesPerSecond': iterations * len(pages) / elapsed,
+        'listingsPerSecond': listings / elapsed
+    }
+
+
+def bench_insert(client, documents, batch_size=None):
+    '''
+        Flight documents mongoWriter gets into mongo per second
+    '''
+
+    from classes.expedia import extract_flights
+    from lib.writer import mongoWriter
+
+    results, _ = load_pages()
+    flights = extract_flights('', results)
+    route = {
+        'departureAirportCode': 'B000',
+        'destinationAirportCode': 'B001',
+        'timePulled': datetime.utcnow(),
+        'source': 'expedia'
+    }
+
+    start_time = time.perf_counter()
+
+    with mongoWriter(
+        db='scraping', collection='flightsBenchmark', batch_size=batch_size
+    ) as writer:
+        for i in range(0, documents, len(flights)):
+            writer.add([
+                dict(route, **flight)
+                for flight in flights[:documents - i]
+            ])
+
+    elapsed = time.perf_counter() - start_time
+
+    client.scraping.flightsBenchmark.delete_many({})
+
+    return {
+        'documents': writer.written,
+        'documentsPerSecond': writer.written / elapsed
+    }
+
+
+def bench_scrape(codes, origins, days):
+    '''
+        Urls, pages and documents scrape_flights gets through per
+        second against the fake expedia
+    '''
+
+    from classes.expedia import expediaScraper
+    from lib.scheduler import DATE_FORMAT, date_windows, searchMatrix
+
+    departure = datetime(2018, 7, 25)
+    last_departure = departure + timedelta(days=days - 1)
+
+    matrix = searchMatrix(
+        origins=codes[:origins],
+        destinations=codes,
+        date_windows=date_windows(
+            departure.strftime(DATE_FORMAT), '07/29/2018',
+            last_departure.strftime(DATE_FORMAT)),
+        passengers=[(2, 0)]
+    )
+
+    scraper = expediaScraper(matrix=matrix)
+    scraper.flight_link = scraper.flight_link.replace('https://', 'http://')
+
+    start_time = time.perf_counter()
+    scraper.scrape_flights(parse_in_processes=False)
+    elapsed = time.perf_counter() - start_time
+
+    metrics = scraper.metrics.to_document()
+
+    return {
+        'urls': len(matrix),
+        'seconds': elapsed,
+        'urlsPerSecond': len(matrix) / elapsed,
+        'pagesPerSecond': metrics['parse']['pages'] / elapsed,
+        'documentsPerSecond': metrics['documents'] / elapsed,
+        'requests': metrics['requests']['total'],
+        'failedRequests': metrics['requests']['failed'],
+        'stageP95': {
+            name: stage['p95'] for name, stage in metrics['stages'].items()
+        }
+    }
+
+
+def git_commit():
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as history:
+        return [json.loads(line) for line in history if line.strip()]
+
+
+def rates(results, prefix=''):
+    '''
+        Every per second number of a result, flattened to
+        {'stage.name': value}
+    '''
+
+    flat = {}
+
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(rates(value, prefix + name + '.'))
+        elif name.endswith('PerSecond'):
+            flat[prefix + name] = value
+
+    return flat
+
+
+def print_results(record, previous=None):
+
+    print('{time} at {commit}'.format(
+        time=record['time'], commit=record['commit']))
+
+    before = rates(previous['results']) if previous else {}
+
+    for name, value in rates(record['results']).items():
+
+        change = ''
+
+        if before.get(name):
+            change = '  {change:+.1%} since {commit}'.format(
+                change=(value - before[name]) / before[name],
+                commit=previous['commit'])
+
+        print('{name:>32}: {value:10.1f}{change}'.format(
+            name=name, value=value, change=change))
+
+    scrape = record['results']['scrape']
+
+    print('{urls} urls in {seconds:.1f}s, {failed} of {requests} requests '
+          'failed'.format(
+              urls=scrape['urls'], seconds=scrape['seconds'],
+              failed=scrape['failedRequests'], requests=scrape['requests']))
+    print('p95 seconds per stage: {stages}'.format(stages=', '.join(
+        '{name} {p95:.3f}'.format(name=name, p95=p95)
+        for name, p95 in sorted(scrape['stageP95'].items()))))
+
+
+def main(args):
+
+    options = {
+        name: value for name, value in vars(args).items()
+        if name not in ('history', 'mongo')
+    }
+    options['mongo'] = 'server' if args.mongo else 'mongomock'
+
+    with tempfile.TemporaryDirectory() as directory, fakeExpedia(
+        proxies=args.proxies,
+        latency=args.latency,
+        latency_spread=args.latency_spread,
+        failure_rate=args.failure_rate,
+        empty_rate=args.empty_rate
+    ) as server:
+
+        configure(args, directory)
+
+        client = use_mongo(args.mongo)
+        codes = seed(client, args.airports, server.proxies)
+
+        results = {
+            'parse': bench_parse(args.parse_iterations),
+            'insert': bench_insert(client, args.documents),
+            'scrape': bench_scrape(codes, args.origins, args.days)
+        }
+
+    record = {
+        'time': datetime.utcnow().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'options': options,
+        'results': results
+    }
+
+    comparable = [
+        i for i in load_history(args.history) if i['options'] == options]
+
+    print_results(record, comparable[-1] if comparable else None)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+
+    with open(args.history, 'a') as history:
+        history.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--airports', type=int, default=100,
+        help='airports seeded, every origin searches all of them')
+    parser.add_argument('--origins', type=int, default=2)
+    parser.add_argument(
+        '--days', type=int, default=1,
+        help='consecutive departure dates searched')
+    parser.add_argument('--proxies', type=int, default=10)
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='seconds the fastest fake proxy takes to answer')
+    parser.add_argument(
+        '--latency-spread', type=float, default=1.0,
+        help='how much slower the slowest proxy is, as a share of latency')
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--empty-rate', type=float, default=0.02)
+    parser.add_argument(
+        '--rate-limit', type=float, default=0,
+        help='requests per second, 0 for no limit')
+    parser.add_argument(
+        '--retry-delay', type=float, default=0.1,
+        help='base retry delay and proxy quarantine in seconds')
+    parser.add_argument('--parse-iterations', type=int, default=50)
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument(
+        '--mongo', metavar='URI',
+        help='local mongo server to use instead of mongomock')
+    parser.add_argument('--history', default=HISTORY)
+
+    # The injected failures and empty pages would flood the output
+    logging.disable(logging.ERROR)
+
+    main(parser.parse_args())
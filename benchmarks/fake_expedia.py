@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+'''
+    Local stand-in for expedia and the free proxies in front of it
+
+    Every port acts as one plain HTTP proxy that answers the request
+    itself with a synthetic result page, so the fetch engine runs
+    exactly as it does against real proxies. Search urls have to use
+    http://, an https:// url would be tunnelled with CONNECT instead
+
+    Each port gets its own latency, spread between latency and
+    latency * (1 + latency_spread), and answers a share of requests
+    with a 503 or the synthetic no results page. The server runs in
+    its own process so it does not compete with the scraper for the
+    GIL
+'''
+
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_pages():
+    '''
+        Reads the synthetic results and no results pages written by
+        benchmarks.make_fixtures
+
+    Returns:
+        (results page bytes, no results page bytes)
+    '''
+
+    pages = []
+
+    for name in ('expedia_results.html', 'expedia_no_results.html'):
+        with open(os.path.join(FIXTURES, name), 'rb') as page:
+            pages.append(page.read())
+
+    return tuple(pages)
+
+
+def _latency(latency, latency_spread, index, proxies):
+
+    return latency * (1 + latency_spread * index / max(proxies - 1, 1))
+
+
+def _serve(sockets, options, ready, stop):
+
+    from aiohttp import web
+
+    results, no_results = load_pages()
+    rng = random.Random(options['seed'])
+
+    async def _main():
+
+        runners = []
+
+        for index, sock in enumerate(sockets):
+
+            latency = _latency(
+                options['latency'], options['latency_spread'], index,
+                len(sockets))
+
+            async def handler(request, latency=latency):
+
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * latency)
+
+                if rng.random() < options['failure_rate']:
+                    return web.Response(status=503)
+
+                body = (
+                    no_results if rng.random() < options['empty_rate']
+                    else results)
+
+                return web.Response(
+                    body=body, content_type='text/html', charset='latin-1')
+
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', handler)
+
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.SockSite(runner, sock).start()
+            runners.append(runner)
+
+        ready.set()
+
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+
+        for runner in runners:
+            await runner.cleanup()
+
+    asyncio.run(_main())
+
+
+class fakeExpedia(object):
+    '''
+        Serves synthetic expedia pages from local ports, one per proxy
+
+        Use as a context manager, or call start() and stop()
+
+    Args:
+        proxies(int): number of proxy ports
+        latency(float): mean seconds the fastest proxy takes to answer
+        latency_spread(float): the slowest proxy takes this much
+            longer, as a share of latency
+        failure_rate(float): share of requests answered with a 503
+        empty_rate(float): share of requests answered with the no
+            results page
+        seed(int): seed of the latency jitter and injected failures
+    '''
+
+    def __init__(
+        self, proxies=10, latency=0.05, latency_spread=1.0,
+        failure_rate=0.05, empty_rate=0.02, seed=0
+    ):
+
+        self.options = {
+            'latency': latency,
+            'latency_spread': latency_spread,
+            'failure_rate': failure_rate,
+            'empty_rate': empty_rate,
+            'seed': seed
+        }
+        self.size = proxies
+
+        self.proxies = []
+        self._process = None
+        self._stop = None
+
+    def __enter__(self):
+
+        self.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.stop()
+
+    def start(self):
+        '''
+            Starts the server process
+
+        Returns:
+            List of proxy urls to load pages through
+        '''
+
+        sockets = []
+
+        for _ in range(self.size):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('127.0.0.1', 0))
+            sockets.append(sock)
+
+        self.proxies = [
+            'http://127.0.0.1:{port}'.format(port=i.getsockname()[1])
+            for i in sockets
+        ]
+
+        context = multiprocessing.get_context('spawn')
+        ready = context.Event()
+        self._stop = context.Event()
+        self._process = context.Process(
+            target=_serve, args=(sockets, self.options, ready, self._stop),
+            daemon=True)
+        self._process.start()
+
+        for sock in sockets:
+            sock.close()
+
+        if not ready.wait(30):
+            self.stop()
+            raise Exception('Fake expedia server did not start')
+
+        return self.proxies
+
+    def stop(self):
+
+        if self._process is None:
+            return
+
+        self._stop.set()
+        self._process.join(10)
+
+        if self._process.is_alive():
+            self._process.terminate()
+
+        self._process = None
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+'''
+    Writes the synthetic expedia pages in benchmarks/fixtures
+
+    Neither page was recorded from expedia. The listings copy the
+    markup the extractors look for, filled with made up airlines,
+    times and prices, and are surrounded by script and nav padding
+    that stands in for the rest of a real result page. The padding
+    is far larger and more regular than on a real page, so numbers
+    measured on these fixtures, the region cut speedup above all,
+    only compare backends and commits with each other
+
+    Steps:
+        -Build the results page, padding around 25 listings
+        -Build the no results page, the same padding around the
+         no results message
+        -Write both to benchmarks/fixtures
+
+    Usage:
+        $python -m benchmarks.make_fixtures [listings]
+
+'''
+
+import os
+import sys
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+SCRIPTS = 200
+NAV_BLOCKS = 800
+
+LISTING = '''\
+<li class="flight-module segment offer-listing" data-test-id="offer-listing">
+  <div class="grid-container standard-padding">
+    <span class="medium-bold">
+<span data-test-id="departure-time">{hour}:15am</span>
+</span>
+    <span data-test-id="arrival-time">{hour}:40pm</span>
+    <div data-test-id="airline-name">Airline {index}</div>
+    <span data-test-id="duration">5h 25m</span>
+    <div class="fluid-content inline-children">
+      <span class="number-stops" data-test-num-stops="{stops}">\
+({stops} stop)</span>
+    </div>
+    <span data-test-id="listing-price-dollars">${price:,}</span>
+    <span data-test-id="seats-left">{seats} left at</span>
+  </div>
+</li>
+'''
+
+
+def padding():
+    '''
+        Script lines for the head and nav blocks for the body
+    '''
+
+    scripts = ''.join(
+        '<script>var x{index} = {index};</script>\n'.format(index=i)
+        for i in range(SCRIPTS))
+    navigation = ''.join(
+        '<div class="nav">\n<a href="/x{index}">link {index}</a>\n'
+        '<p>text {index}</p>\n</div>\n'.format(index=i)
+        for i in range(NAV_BLOCKS))
+
+    return scripts, navigation
+
+
+def page(content):
+
+    scripts, navigation = padding()
+
+    return (
+        '<html>\n<head>\n<title>Flights</title>\n' + scripts +
+        '</head>\n<body>\n' + navigation + content + navigation +
+        '</body>\n</html>')
+
+
+def results_page(listings=25):
+
+    return page(
+        '<ul id="flightModuleList">\n' + ''.join(
+            LISTING.format(
+                index=i, hour=i % 12 + 1, stops=i % 3, price=200 + 37 * i,
+                seats=i % 9 + 1)
+            for i in range(listings)) +
+        '</ul>\n')
+
+
+def no_results_page():
+
+    return page('<div class="no-results">No flights found</div>\n')
+
+
+def main(listings=25):
+
+    for name, body in (
+        ('expedia_results.html', results_page(listings)),
+        ('expedia_no_results.html', no_results_page())
+    ):
+        path = os.path.join(FIXTURES, name)
+        with open(path, 'w', encoding='latin-1') as fixture:
+            fixture.write(body)
+        print('Wrote {path}'.format(path=path))
+
+
+if __name__ == '__main__':
+
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 25)
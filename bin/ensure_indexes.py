@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+'''
+    Creates the mongo indexes the scraper and dashboard need
+    and reports any query that still scans or sorts in memory
+
+    Usage:
+        $./ensure_indexes.py
+
+'''
+
+import logging
+
+from lib.decorator import execute
+from lib.indexes import check_query_plans, ensure_indexes
+
+file_name = (
+    '../log/' +
+    str(__file__).replace('.py', '').replace('./', '') +
+    '.log'
+)
+logging.basicConfig(filename=file_name, level=logging.INFO)
+
+
+@execute
+def main():
+
+    failed = ensure_indexes()
+    slow = check_query_plans()
+
+    for name in failed:
+        print('Index not created: {name}'.format(name=name))
+
+    for namespace, query, stages in slow:
+        print('Slow plan on {namespace} {query}: {stages}'.format(
+            namespace=namespace, query=query, stages=', '.join(stages)))
+
+    if not failed and not slow:
+        print('All indexes present and every query plan uses one')
+
+
+if __name__ == '__main__':
+
+    main()
@@ -5,8 +5,8 @@
 
     Steps:
         -Pull proxy IPs from sslproxies
-        -Test the proxy
-        -Store working proxies in mongo
+        -Test every proxy concurrently with a lightweight probe
+        -Store each result in mongo as soon as it is known
 
     Usage:
         $./populate_proxy_ips.py
@@ -14,13 +14,10 @@
 '''
 
 import logging
-import requests
-import concurrent.futures
-import asyncio
 
-from bs4 import BeautifulSoup
-
-from lib.decorator import connect, execute
+from lib import loop
+from lib.decorator import execute
+from lib.proxies import harvest_proxies, record_validation, validate_proxies
 
 file_name = (
     '../log/' +
@@ -43,29 +40,7 @@ def get_proxy_ips():
         usability
     '''
 
-    logging.info('Getting proxy IPs from https://sslproxies.org')
-
-    reponse = requests.get(
-        'https://www.sslproxies.org/').text
-
-    soup = BeautifulSoup(reponse, 'html.parser')
-    proxies_table = soup.find(id='proxylisttable')
-
-    proxies = []
-
-    for row in proxies_table.tbody.find_all('tr'):
-
-        scraped_data = row.find_all('td')
-
-        if scraped_data[4].string.lower() == 'elite proxy':
-
-            url = (
-                "https://" +
-                scraped_data[0].string + ':' +
-                scraped_data[1].string
-            )
-
-            proxies.append(url)
+    proxies = harvest_proxies()
 
     logging.info('Testing {len} potential proxies'.format(
         len=len(proxies)))
@@ -76,47 +51,17 @@ def get_proxy_ips():
 def async_test_proxies(proxies):
     '''
         Asynchronously test proxy IP connections to
-        expedia
+        expedia, saving each result as it comes in
     '''
 
     logging.info(
         'Starting to test connections to {number} proxies'
         .format(number=len(proxies)))
 
-    def return_response(proxy):
-
-        try:
-            response = requests.get(
-                'https://www.expedia.com',
-                proxies={'https': proxy},
-                timeout=60
-            )
-            if response.status_code == requests.codes.ok:
-                logging.info(
-                    'PROXY: {proxy} GOOD CONNECTION, PROXY SAVED'
-                    .format(proxy=proxy))
-                return proxy
-        except Exception:
-            logging.info('PROXY: {proxy} BAD CONNECTION'.format(proxy=proxy))
-
-    async def _gather_tasks(loop, proxies):
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            tasks = [loop.run_in_executor(
-                executor,
-                return_response,
-                proxy) for proxy in proxies
-            ]
-        return await asyncio.gather(*tasks)
+    return loop.run(validate_proxies(proxies, record_validation))
 
-    loop = asyncio.get_event_loop()
-    responses = loop.run_until_complete(_gather_tasks(loop, proxies))
 
-    return [i for i in responses if i is not None]
-
-
-@connect('MONGO')
-def test_proxies_and_load_to_mongo(client, proxies):
+def test_proxies_and_load_to_mongo(proxies):
     '''
         Makes a connection with the proxy ip
         to ensure it is usable
@@ -124,10 +69,10 @@ def test_proxies_and_load_to_mongo(client, proxies):
 
     good_proxy_ips = async_test_proxies(proxies)
 
-    client.scraping.proxyIps.update(
-        {'_id': 'proxyIps'},
-        {'$set': {'ipList': good_proxy_ips}}
-    )
+    logging.info('{good} / {total} proxies usable'.format(
+        good=len(good_proxy_ips), total=len(proxies)))
+
+    return good_proxy_ips
 
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+'''
+    Keeps the saved proxy list fresh without anyone having to
+    run populate_proxy_ips by hand
+
+    Steps:
+        -Harvest new proxy IPs from sslproxies
+        -Re-validate them together with every saved proxy
+        -Sleep, for less time while fewer than the minimum are healthy
+        -Repeat until stopped
+
+    Running scrapes reload the saved list on their own, so
+    new proxies are used without restarting them
+
+    Usage:
+        $./refresh_proxies.py [--once]
+
+'''
+
+import argparse
+import logging
+import time
+
+from configs.config import Configs
+from lib import loop
+from lib.decorator import execute
+from lib.proxies import (
+    harvest_proxies, load_saved_proxies, record_validation, validate_proxies
+)
+
+file_name = (
+    '../log/' +
+    str(__file__).replace('.py', '').replace('./', '') +
+    '.log'
+)
+logging.basicConfig(filename=file_name, level=logging.INFO)
+
+
+@execute
+def main(once=False, interval=None, min_pool=None):
+
+    interval = interval or Configs.proxy_refresh_interval
+    min_pool = min_pool or Configs.proxy_min_pool
+
+    while True:
+
+        try:
+            healthy = refresh_proxies()
+        except Exception:
+            logging.exception('Proxy refresh failed')
+            healthy = 0
+
+        if once:
+            return
+
+        if healthy < min_pool:
+            logging.info(
+                'Only {healthy} healthy proxies, wanted {min_pool}, '
+                'refreshing again soon'.format(
+                    healthy=healthy, min_pool=min_pool))
+            time.sleep(Configs.proxy_refresh_retry)
+        else:
+            time.sleep(interval)
+
+
+def refresh_proxies():
+    '''
+        Harvests candidates and re-validates them along with
+        the saved proxies
+
+    Returns:
+        Number of healthy proxies
+    '''
+
+    saved = load_saved_proxies()
+
+    try:
+        candidates = harvest_proxies()
+    except Exception:
+        logging.exception('Could not harvest new proxies')
+        candidates = []
+
+    proxies = list(dict.fromkeys(candidates + saved))
+
+    logging.info(
+        'Validating {number} proxies, {new} new'.format(
+            number=len(proxies), new=len(set(candidates) - set(saved))))
+
+    good = loop.run(validate_proxies(proxies, record_validation))
+
+    logging.info('{good} / {total} proxies healthy'.format(
+        good=len(good), total=len(proxies)))
+
+    return len(good)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--once', action='store_true', help='refresh once and exit')
+    args = parser.parse_args()
+
+    main(once=args.once)
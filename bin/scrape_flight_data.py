@@ -2,11 +2,25 @@
 
 '''
     Scrapes travel websites for travel data
+
+Usage:
+    python scrape_flight_data.py
+    python scrape_flight_data.py --origin PHL --origin JFK
+    python scrape_flight_data.py --last-departure 08/25/2018
+    python scrape_flight_data.py --resume [RUN_ID]
+    python scrape_flight_data.py --enqueue
+    python scrape_flight_data.py --profile [DIR] --profile-parsers
 '''
 
+import argparse
 import logging
 
-from lib.decorator import connect, execute
+from configs.config import Configs
+from lib.airports import airport_registry
+from lib.decorator import execute
+from lib.indexes import ensure_indexes
+from lib.profiling import report
+from lib.scheduler import date_windows, searchMatrix
 from classes.expedia import expediaScraper
 
 file_name = (
@@ -19,46 +33,105 @@ logging.basicConfig(filename=file_name, level=logging.INFO)
 
 @execute
 def main(
-    departure_location, departure_date, return_date,
-    num_adults, num_children, destination_location=None
+    departure_locations, departure_date, return_date,
+    num_adults, num_children, destination_locations=None,
+    last_departure_date=None, resume=None, enqueue=False,
+    profile_parsers=None
 ):
 
-    if not destination_location:
-        locations = pull_all_airports(departure_location)
-        airport_codes = [i['code'] for i in locations]
-    else:
-        airport_codes = [destination_location]
+    ensure_indexes()
 
-    expedia_obj = expediaScraper(
-        from_code=departure_location,
-        to_codes=airport_codes,
-        departure_date=departure_date,
-        return_date=return_date,
-    ).scrape_flights()
+    if resume:
+        scraper = expediaScraper.resume(
+            None if resume == 'latest' else resume)
+        scrape(scraper, profile_parsers)
+        return
 
+    if not destination_locations:
+        destination_locations = airport_registry().codes()
 
-@connect('MONGO')
-def pull_all_airports(client, departure_location):
-    '''
-        Pulls all airport codes stored in mongo except for
-        the departure location
-    '''
+    matrix = searchMatrix(
+        origins=departure_locations,
+        destinations=destination_locations,
+        date_windows=date_windows(
+            departure_date, return_date, last_departure_date),
+        passengers=[(num_adults, num_children)]
+    )
+
+    logging.info('Search matrix holds {number} searches'.format(
+        number=len(matrix)))
 
-    logging.info('Pulling airport codes from mongo')
+    scraper = expediaScraper(matrix=matrix)
 
-    airports = list(
-        client.airports.airportCodes.find({
-            'code': {'$ne': departure_location}}))
+    if enqueue:
+        print('Saved run {run_id} for scrape_worker.py'.format(
+            run_id=scraper.enqueue()))
+    else:
+        scrape(scraper, profile_parsers)
+
+
+def scrape(scraper, profile_parsers=None):
+    '''
+        Runs the scraper, then prints the hottest functions of its
+        parser workers when they were profiled
+    '''
 
-    return airports
+    try:
+        scraper.scrape_flights(profile_dir=profile_parsers)
+    finally:
+        if scraper.parser_profile:
+            print('Saved parser worker profile to {path}'.format(
+                path=scraper.parser_profile))
+            report(scraper.parser_profile)
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--origin', action='append', dest='origins', metavar='CODE',
+        help='departure airport, repeat for several (default: PHL)')
+    parser.add_argument(
+        '--destination', action='append', dest='destinations',
+        metavar='CODE', help='arrival airport, repeat for several '
+        '(default: every saved airport)')
+    parser.add_argument('--departure', default='07/25/2018')
+    parser.add_argument('--return', dest='return_date', default='07/29/2018')
+    parser.add_argument(
+        '--last-departure', metavar='DATE',
+        help='also search every later departure up to this date, '
+        'keeping the trip length')
+    parser.add_argument('--adults', type=int, default=2)
+    parser.add_argument('--children', type=int, default=0)
+    parser.add_argument(
+        '--resume', nargs='?', const='latest', metavar='RUN_ID',
+        help='continue an interrupted run, the latest one if no id is given')
+    parser.add_argument(
+        '--enqueue', action='store_true',
+        help='only save the run for scrape_worker.py to load')
+    parser.add_argument(
+        '--profile', nargs='?', const=Configs.profile_dir, metavar='DIR',
+        help='run under cProfile, save the profile to DIR and print '
+        'the hottest functions')
+    parser.add_argument(
+        '--profile-parsers', action='store_true',
+        help='with --profile, also profile the parser workers into a '
+        'profile of their own')
+    args = parser.parse_args()
+
+    if args.profile_parsers and not args.profile:
+        parser.error('--profile-parsers needs --profile')
+
     main(
-        departure_location="PHL",
-        departure_date="07/25/2018",
-        return_date="07/29/2018",
-        num_adults=2,
-        num_children=0
+        departure_locations=args.origins or ['PHL'],
+        departure_date=args.departure,
+        return_date=args.return_date,
+        num_adults=args.adults,
+        num_children=args.children,
+        destination_locations=args.destinations,
+        last_departure_date=args.last_departure,
+        resume=args.resume,
+        enqueue=args.enqueue,
+        profile_parsers=args.profile if args.profile_parsers else None,
+        profile=args.profile
     )
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+'''
+    Works through the urls of a saved scrape run alongside any
+    number of other workers
+
+    Steps:
+        -Load the run, the latest unfinished one if no id is given
+        -Claim urls from the run's work queue and scrape them
+        -Wait while other workers still hold leases, picking up
+         the urls of any whose leases expire
+        -Mark the run finished and save its summary
+
+    Start the run with scrape_flight_data.py --enqueue, then start
+    workers on as many machines or containers as wanted
+
+    fetch_rate_limit is the rate for the whole run, not for each
+    worker. Every worker counts the workers of the run that sent a
+    heartbeat within the last lease and sends each site its share,
+    fetch_rate_limit / live workers. Heartbeats go out three times
+    per lease, so a worker that joins or dies shifts the shares
+    within a third of a lease
+
+    Usage:
+        $./scrape_worker.py [RUN_ID] [--claim-size N]
+
+'''
+
+import argparse
+import logging
+import time
+
+from configs.config import Configs
+from lib.decorator import execute
+from lib.indexes import ensure_indexes
+from lib.runs import finish_run
+from lib.summary import write_run_summary
+from lib.workqueue import workQueue
+from classes.expedia import expediaScraper
+
+file_name = (
+    '../log/' +
+    str(__file__).replace('.py', '').replace('./', '') +
+    '.log'
+)
+logging.basicConfig(filename=file_name, level=logging.INFO)
+
+
+@execute
+def main(run_id=None, claim_size=None):
+
+    ensure_indexes()
+
+    scraper = expediaScraper.resume(run_id)
+    queue = workQueue(
+        scraper.run_id, scraper.run_time, claim_size=claim_size)
+
+    while True:
+
+        scraper.work(queue)
+
+        outstanding = queue.outstanding()
+
+        if not outstanding:
+            break
+
+        logging.info(
+            '{number} urls are leased by other workers, waiting for them '
+            'to finish or expire'.format(number=outstanding))
+        time.sleep(Configs.worker_idle_wait)
+
+    finish_run(scraper.run_id)
+    write_run_summary(scraper.run_time)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'run_id', nargs='?', help='run to work on, the latest unfinished '
+        'run if not given')
+    parser.add_argument(
+        '--claim-size', type=int, help='urls claimed at a time')
+    args = parser.parse_args()
+
+    main(run_id=args.run_id, claim_size=args.claim_size)
@@ -9,35 +9,139 @@ Steps:
 '''
 
 import logging
+import os
+import concurrent.futures
 from datetime import datetime
-import math
 
-from bs4 import BeautifulSoup
-import pandas as pd
+from configs.config import Configs
+from lib.airports import airport_registry
+from lib.extractors import listingExtractor
+from lib.metrics import runMetrics
+from lib.runs import (
+    discard_partial_documents, finish_run, load_run, run_id_for,
+    runCheckpoint, start_run, unfinished_urls
+)
+from lib.scheduler import searchMatrix
+from lib.summary import write_run_summary
+from lib.writer import mongoWriter
 
-from lib import utils
-from lib.decorator import connect
+
+FLIGHT_FIELDS = {
+    'departure-time': 'span',
+    'arrival-time': 'span',
+    'airline-name': 'div',
+    'listing-price-dollars': 'span',
+    'duration': 'span',
+    'seats-left': 'span'
+}
+
+_flight_extractor = None
+
+
+def flight_extractor():
+    '''
+        Builds the listing extractor once per process
+    '''
+
+    global _flight_extractor
+
+    if _flight_extractor is None:
+        _flight_extractor = listingExtractor(
+            region_tag='ul',
+            region_id='flightModuleList',
+            listing_tag='li',
+            listing_class='flight-module segment offer-listing',
+            fields=FLIGHT_FIELDS,
+            attributes=('data-test-num-stops',)
+        )
+
+    return _flight_extractor
+
+
+def _to_int(value, digits_only=False):
+
+    if value is None:
+        return None
+
+    if digits_only:
+        value = ''.join([i for i in value if i.isdigit()])
+    else:
+        value = value.lstrip('$').replace(',', '')
+
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def extract_flights(url, body):
+    '''
+        Pulls every flight listing out of an expedia results page
+
+        Only needs the raw page so it can run inside a worker
+        process and hand back plain dicts
+
+    Args:
+        url(str): url the page was loaded from, the route key
+        body(bytes): raw response body
+
+    Returns:
+        List of listing field dicts in page order, each with its
+        1-based rank on the page
+    '''
+
+    listings = flight_extractor().extract(body.decode('latin-1'))
+
+    if not listings:
+        logging.error('Cannot parse HTML for flights, no data available')
+
+    return [
+        {
+            'rank': rank,
+            'departureTime': flight.get('departure-time'),
+            'arrivalTime': flight.get('arrival-time'),
+            'airline': flight.get('airline-name'),
+            'seatsLeft': _to_int(flight.get('seats-left'), digits_only=True),
+            'price': _to_int(flight.get('listing-price-dollars')),
+            'duration': flight.get('duration'),
+            'layovers': _to_int(flight.get('data-test-num-stops'))
+        }
+        for rank, flight in enumerate(listings, 1)
+    ]
 
 
 class expediaScraper():
     '''
         Scrapes expedia for travel information by airport code,
         departure date, return date, and number of travelers
+
+        Searches one origin for one trip, or every search of a
+        searchMatrix when matrix is given
+
+    Args:
+        run_time(datetime): timePulled of the run, now if not given
+        run_id(str): saved run to continue, a new run if not given
+        matrix(searchMatrix): searches to run instead of the single
+            origin and trip
     '''
 
     def __init__(
-        self, from_code, to_codes, departure_date, return_date,
-        adults=1, children=0
+        self, from_code=None, to_codes=(), departure_date=None,
+        return_date=None, adults=1, children=0, run_time=None, run_id=None,
+        matrix=None
     ):
 
-        self.from_code = from_code
-        self.to_codes = to_codes
-        self.departure_date = departure_date
-        self.return_date = return_date
-        self.adults = adults
-        self.children = children
-        self.airport_information = self.pull_airport_codes()
-        self.run_time = datetime.utcnow()
+        self.matrix = matrix or searchMatrix(
+            origins=[from_code],
+            destinations=to_codes,
+            date_windows=[(departure_date, return_date)],
+            passengers=[(adults, children)]
+        )
+        self.airports = airport_registry()
+        self.run_time = run_time or datetime.utcnow()
+        self.run_id = run_id
+        self.metrics = None
+        self.parser_profile = None
 
         self.flight_link = (
             "https://www.expedia.com/Flights-Search?trip="
@@ -46,6 +150,26 @@ class expediaScraper():
             "to:{to_code},departure:{return_date}TTANYT&passengers=children:"
             "{children},adults:{adults}&mode=search")
 
+    @classmethod
+    def resume(cls, run_id=None):
+        '''
+            Rebuilds a scraper for an interrupted run
+
+        Args:
+            run_id(str): run to continue, the latest unfinished run
+                if not given
+        '''
+
+        run = load_run(run_id)
+        params = dict(run['params'])
+
+        if 'matrix' in params:
+            params['matrix'] = searchMatrix.from_document(params['matrix'])
+
+        logging.info('Resuming run {run_id}'.format(run_id=run['_id']))
+
+        return cls(run_time=run['runTime'], run_id=run['_id'], **params)
+
     def price_per_mile(self, distance, price):
         '''
             Calculates price per mile
@@ -55,185 +179,284 @@ class expediaScraper():
             return round((price / distance), 2)
         return None
 
-    @connect('MONGO')
-    def pull_airport_codes(client, self):
+    def enqueue(self):
+        '''
+            Saves a new run with every url of the matrix pending so
+            scrape_flights or any number of workers can load them
+
+        Returns:
+            Id of the run
+        '''
+
+        self.urls = self.build_urls()
+        self.run_id = run_id_for(self.run_time)
+
+        start_run(
+            self.run_id, self.run_time,
+            {'matrix': self.matrix.to_document()}, self.urls)
 
-        return pd.DataFrame(
-            list(client.airports.airportCodes.find({}))).set_index(
-                '_id').to_dict('index')
+        return self.run_id
 
-    def scrape_flights(self):
+    def scrape_flights(self, parse_in_processes=None, profile_dir=None):
         '''
             Scrapes an expedia webpage for flight information
             to be saved for later use
+
+        Args:
+            parse_in_processes(bool): parse pages on a process pool with
+                one worker per core, defaults to Configs.parse_in_processes
+            profile_dir(str): profile the parser workers and save the
+                merged profile here, its path is kept in
+                self.parser_profile
+        '''
+
+        if self.run_id:
+            self.urls = unfinished_urls(self.run_id)
+            discard_partial_documents(self.run_time, self.urls)
+        else:
+            self.enqueue()
+
+        logging.info('Scraping {number} urls'.format(number=len(self.urls)))
+
+        try:
+            self.load_urls(
+                iter(self.urls), parse_in_processes, profile_dir=profile_dir)
+        finally:
+            finish_run(self.run_id)
+
+        write_run_summary(self.run_time)
+
+    def work(self, queue, parse_in_processes=None):
+        '''
+            Scrapes the urls claimed from a shared work queue until it
+            has nothing left to claim
+
+            Claims of claim_size urls are made off the event loop as
+            the fetch engine asks for more urls
+
+        Args:
+            queue(workQueue): queue of the run this scraper was
+                resumed for
+            parse_in_processes(bool): as in scrape_flights
         '''
 
         self.urls = {}
 
-        for code in self.to_codes[:100]:
+        async def _claimed():
+            async for url, job in queue.claimed_jobs():
+                self.urls[url] = job
+                yield url
+
+        with queue:
+            self.load_urls(
+                _claimed(), parse_in_processes, worker_id=queue.worker_id,
+                rate_limit=queue.rate_limiter)
+
+        logging.info(
+            'Worker {worker} scraped {claimed} urls, {reclaimed} from '
+            'expired leases'.format(
+                worker=queue.worker_id, claimed=queue.claimed,
+                reclaimed=queue.reclaimed))
+
+    def load_urls(
+        self, urls, parse_in_processes=None, worker_id=None, profile_dir=None,
+        rate_limit=None
+    ):
+        '''
+            Loads, parses and saves urls of self.urls, checkpointing
+            each one in the run and saving its metrics to
+            scraping.runStats
+
+        Args:
+            urls(iterable): urls to load, may be a lazy or async iterator
+            parse_in_processes(bool): as in scrape_flights
+            worker_id(str): worker the metrics are saved for
+            profile_dir(str): as in scrape_flights
+            rate_limit(rateLimiter): limiter shared with a work queue,
+                fetch_rate_limit for this process alone if not given
+        '''
+
+        # The fetch stack pulls in aiohttp, only load it when a run
+        # actually loads pages
+        from lib.cache import responseCache
+        from lib.pipeline import run_pipeline
+        from lib.proxies import load_proxy_pool, save_proxy_pool
 
-            url = self.flight_link.format(
-                from_code=self.from_code,
-                to_code=code,
-                departure_date=self.departure_date,
-                return_date=self.return_date,
-                children=self.children,
-                adults=self.adults
-            )
+        if parse_in_processes is None:
+            parse_in_processes = Configs.parse_in_processes
+
+        parse = extract_flights
 
-            self.urls[url] = {
-                'from': self.from_code,
-                'to': code
-            }
+        if profile_dir:
+            from lib import profiling
 
-        url_chunks = utils.chunk_list(list(self.urls.keys()), 300)
-        chunk_count = math.ceil((len(list(self.urls.keys())) / 300))
+            profile = profiling.profile_name('parse')
+            parse = profiling.profiledParser(parse, profile_dir, profile)
 
-        for i in range(chunk_count):
+        workers = None
+        executor = None
 
-            logging.info(
-                '\n\n~~~~! PARSING URL CHUNK {i} / {total} !~~~~\n\n'
-                .format(i=(i + 1), total=chunk_count))
+        if parse_in_processes:
+            workers = os.cpu_count() or 1
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers)
 
-            responses = utils.async_load_responses(next(url_chunks))
+        # Building or mapping the distance matrix takes long enough
+        # to stall every fetch if the first parsed page did it
+        self.airports.distances()
 
-            for response in responses:
-                for url, resp in response.items():
-                    self.html_flight_parser(url, resp)
+        proxies = load_proxy_pool()
+        proxies.start_reloading()
 
-    def html_flight_parser(self, url, response):
+        cache = responseCache() if Configs.cache_ttl else None
+        checkpoint = runCheckpoint(self.run_id)
+        self.metrics = runMetrics(self.run_id, worker_id)
+
+        try:
+            with mongoWriter(
+                db='scraping', collection='flights',
+                on_flush=checkpoint.record_written, metrics=self.metrics
+            ) as writer:
+                run_pipeline(
+                    urls=urls,
+                    proxies=proxies,
+                    parse=parse,
+                    build=self.build_flight_documents,
+                    store=writer.add,
+                    parse_workers=workers,
+                    parse_executor=executor,
+                    on_failure=checkpoint.record_failure,
+                    metrics=self.metrics,
+                    cache=cache,
+                    cache_key=self.route_key,
+                    rate_limit=rate_limit
+                )
+        finally:
+            proxies.stop_reloading()
+            save_proxy_pool(proxies)
+            if executor:
+                executor.shutdown(wait=True)
+            if profile_dir:
+                profiling.save_worker_profiles(profile_dir, profile)
+                self.parser_profile = profiling.merge_profiles(
+                    profile_dir, profile)
+                if self.parser_profile:
+                    logging.info(
+                        'Saved parser worker profile to {path}'.format(
+                            path=self.parser_profile))
+            if cache:
+                logging.info(
+                    'Response cache: {hits} hits, {misses} misses'.format(
+                        hits=cache.hits, misses=cache.misses))
+                cache.close()
+            self.metrics.log_summary()
+            self.metrics.save()
+
+    def build_urls(self):
         '''
-            Parses flight HTML to find flight data and stores
-            the data into mongo.
+            Builds the search url for every job of the matrix
+
+        Returns:
+            Dictionary {url: route job} in priority order
         '''
 
-        try:
-            html = response.text.encode('UTF-8').decode('latin-1')
-            soup = BeautifulSoup(html, 'html.parser')
-            flight_container = soup.find('ul', {'id': 'flightModuleList'})
-            flight = list(flight_container.find_all('li', {'class': "flight-module segment offer-listing"}))[0]
-        except Exception:
-            logging.error('Cannot parse HTML for flights, no data available')
-            flight = None
-
-        if flight:
-
-            try:
-                departure_time = flight.find(
-                    'span', {'data-test-id': 'departure-time'}
-                ).text.strip()
-            except Exception:
-                departure_time = None
-
-            try:
-                arrival_time = flight.find(
-                    'span', {'data-test-id': 'arrival-time'}).text.strip()
-            except Exception:
-                arrival_time = None
-
-            try:
-                airline = flight.find(
-                    'div', {'data-test-id': 'airline-name'}).text.strip()
-            except Exception:
-                airline = None
-
-            try:
-                price = int(flight.find(
-                    'span', {"data-test-id": "listing-price-dollars"}
-                ).text.strip().lstrip('$').replace(',', ''))
-            except Exception:
-                price = None
-
-            try:
-                flight_time = flight.find(
-                    'span', {'data-test-id': 'duration'}).text.strip()
-            except Exception:
-                flight_time = None
-
-            try:
-                layovers = int([
-                    i.get('data-test-num-stops') for i in flight.find(
-                        'div',
-                        {'class': 'fluid-content inline-children'}
-                    ).find_all('span') if i.get(
-                        'data-test-num-stops') is not None][0])
-            except Exception:
-                layovers = None
-
-            try:
-                seats_left = int(''.join(
-                    [i for i in flight.find(
-                        'span', {'data-test-id': 'seats-left'}
-                    ).text.strip() if i.isdigit()]))
-            except Exception:
-                seats_left = None
-
-            from_code = self.urls[url].get('from')
-            to_code = self.urls[url].get('to')
-
-            origin_information = self.airport_information.get(
-                from_code, {})
-            destination_information = self.airport_information.get(
-                to_code, {})
-
-            origin_point = [
-                origin_information.get('latitude'),
-                origin_information.get('longitude')
-            ]
-
-            destination_point = [
-                destination_information.get('latitude'),
-                destination_information.get('longitude')
-            ]
-
-            distance = utils.haversine_distance(
-                origin_point, destination_point, miles=True
+        urls = {}
+
+        for job in self.matrix.jobs():
+
+            url = self.flight_link.format(
+                from_code=job['from'],
+                to_code=job['to'],
+                departure_date=job['departureDate'],
+                return_date=job['returnDate'],
+                children=job['children'],
+                adults=job['adults']
             )
 
-            document = {
-                'departureLocation': (
-                    origin_information.get('city', '') + ', ' +
-                    origin_information.get('country', '')
-                ),
-                'destinationLocation': (
-                    destination_information.get('city', '') + ', ' +
-                    destination_information.get('country', '')
-                ),
-                'departureAirportCode': origin_information.get('code'),
-                'destinationAirportCode': destination_information.get(
-                    'code'),
-                'departureAirportName': origin_information.get(
-                    'airportName'),
-                'destinationAirportName': destination_information.get(
-                    'airportName'),
-                'distance': distance,
-                'destinationLatLong': destination_point,
-                'departureLatLong': origin_point,
-                'departureDate': self.departure_date,
-                'returnDate': self.return_date,
-                'departureTime': departure_time,
-                'arrivalTime': arrival_time,
-                'airline': airline,
-                'seatsLeft': seats_left,
-                'price': price,
-                'pricePerMile': self.price_per_mile(distance, price),
-                'duration': flight_time,
-                'layovers': layovers,
-                'timePulled': self.run_time,
-                'source': 'expedia',
-                'link': url
-            }
-
-            logging.info(
-                'Found from {leave} to {arrive} price: {price}!'
-                .format(
-                    leave=self.urls[url].get('from'),
-                    arrive=self.urls[url].get('to'),
-                    price=price
-                ))
-
-            if document:
-                utils.insert_documents_to_mongo(
-                    db='scraping',
-                    collection='flights',
-                    docs=[document])
+            urls[url] = job
+
+        return urls
+
+    def route_key(self, url):
+        '''
+            Identifies the search behind a url, used as its cache key
+        '''
+
+        job = self.urls[url]
+
+        return ':'.join(str(job.get(i)) for i in (
+            'from', 'to', 'departureDate', 'returnDate', 'adults', 'children'
+        ))
+
+    def build_flight_documents(self, url, flights):
+        '''
+            Adds route and airport information to the parsed listings
+            of a page
+
+        Args:
+            url(str): url the listings were loaded from
+            flights(list): listing field dicts from extract_flights
+
+        Returns:
+            List of flight documents ready for mongo
+        '''
+
+        if self.metrics is not None:
+            self.metrics.record_page(flights, [
+                field
+                for flight in flights
+                for field, value in flight.items() if value is None
+            ])
+
+        if not flights:
+            return []
+
+        job = self.urls[url]
+        from_code = job.get('from')
+        to_code = job.get('to')
+
+        origin = self.airports.get(from_code)
+        destination = self.airports.get(to_code)
+
+        distance = self.airports.distances().distance(from_code, to_code)
+
+        route = {
+            'departureLocation': origin.location,
+            'destinationLocation': destination.location,
+            'departureAirportCode': origin.code,
+            'destinationAirportCode': destination.code,
+            'departureAirportName': origin.airport_name,
+            'destinationAirportName': destination.airport_name,
+            'distance': distance,
+            'destinationLatLong': destination.point,
+            'departureLatLong': origin.point,
+            'departureDate': job.get('departureDate'),
+            'returnDate': job.get('returnDate'),
+            'timePulled': self.run_time,
+            'source': 'expedia',
+            'link': url
+        }
+
+        documents = []
+
+        for flight in flights:
+
+            document = dict(route)
+            document.update(flight)
+            document['pricePerMile'] = self.price_per_mile(
+                distance, flight.get('price'))
+
+            documents.append(document)
+
+        prices = [i['price'] for i in documents if i['price'] is not None]
+
+        logging.info(
+            'Found {number} flights from {leave} to {arrive} price: {price}!'
+            .format(
+                number=len(documents),
+                leave=from_code,
+                arrive=to_code,
+                price=min(prices) if prices else None
+            ))
+
+        return documents
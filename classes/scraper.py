@@ -3,10 +3,11 @@
 '''
 
 import logging
-import requests
-import random
+import time
 
 from lib.decorator import connect
+from lib.proxies import load_proxy_pool
+from lib.retry import retryScheduler
 
 
 class scraper(object):
@@ -24,30 +25,60 @@ class scraper(object):
         return [i.get('ipList') for i in list(
             client.scraping.proxyIps.find({}))][0]
 
-    def load_webpage(self, link):
+    @property
+    def proxy_pool(self):
         '''
-            Chooses a random proxy to load the webpage with
-            if a proxy does not work, continue looping through
-            proxy ips until it finds one that works
+            Scored pool of the saved proxies, loaded on first use
         '''
 
-        while True:
+        if getattr(self, '_proxy_pool', None) is None:
+            self._proxy_pool = load_proxy_pool(
+                getattr(self, 'proxies', None))
 
-            if not self.proxies:
-                raise Exception(
-                    'Not able to load webpage, expended proxy '
-                    'list without a successful connection.')
+        return self._proxy_pool
+
+    def load_webpage(self, link, retries=None):
+        '''
+            Chooses a proxy weighted by its past performance to load
+            the webpage with, if a proxy does not work, retry through
+            a different proxy while the retry budget allows
+
+        Args:
+            link(str): url to load
+            retries(retryScheduler): retry budget, a fresh one if not given
+        '''
+
+        import requests
 
-            random_proxy = random.choice(self.proxies)
+        retries = retries or retryScheduler()
+        tried = set()
+        attempt = 0
+
+        while True:
+
+            attempt += 1
+            proxy = self.proxy_pool.choose(exclude=tried)
+            start_time = time.monotonic()
 
             try:
                 response = requests.get(
-                    link, proxies={'https': random_proxy})
+                    link, proxies={'https': proxy})
 
                 if response.status_code == requests.codes.ok:
+                    self.proxy_pool.record_success(
+                        proxy, time.monotonic() - start_time)
                     return response
             except Exception:
                 logging.info('Bad proxy: {proxy}'.format(
-                    proxy=random_proxy))
+                    proxy=proxy))
+
+            self.proxy_pool.record_failure(
+                proxy, time.monotonic() - start_time)
+            tried.add(proxy)
+
+            if not retries.should_retry(attempt):
+                raise Exception(
+                    'Not able to load webpage, retry budget spent '
+                    'without a successful connection.')
 
-            self.proxies.remove(random_proxy)
+            time.sleep(retries.delay(attempt))
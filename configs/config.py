@@ -2,16 +2,128 @@
     Holds all of the configurations for the project
     Call the class inside of new scripts and instantly
     import all known configurations
+
+    Every setting can be overridden with an AIRTIME_* environment
+    variable of the same name, e.g. AIRTIME_FETCH_CONCURRENCY=1000
 '''
 
-import logging
+import os
+
+
+def _env(name, default, cast=str):
+
+    value = os.environ.get('AIRTIME_' + name.upper())
+
+    if value is None:
+        return default
+    return cast(value)
+
+
+def _flag(value):
+
+    return value.lower() in ('1', 'true', 'yes')
 
 
 class Configs():
 
     current_file = str(__file__).replace('.py', '')
     log_format = '%(asctime)-15s %(clientip)s %(user)-8s %(message)s'
-    logging = logging.basicConfig(
-        filename=__name__.replace('.py', '.log'),
-        format=log_format
-    )
+
+    # Fetch engine
+    fetch_concurrency = _env('fetch_concurrency', 500, int)
+    fetch_per_proxy_limit = _env('fetch_per_proxy_limit', 20, int)
+    fetch_timeout = _env('fetch_timeout', 60, float)
+    fetch_connect_timeout = _env('fetch_connect_timeout', 10, float)
+    # Requests per second sent to one site, 0 for no limit. Workers of
+    # a shared run split it between them
+    fetch_rate_limit = _env('fetch_rate_limit', 50, float)
+    fetch_rate_burst = _env('fetch_rate_burst', 50, int)
+
+    # Run event loops on uvloop when it is installed
+    use_uvloop = _env('use_uvloop', True, _flag)
+
+    # Fetch -> parse -> store pipeline
+    pipeline_queue_size = _env('pipeline_queue_size', 200, int)
+    pipeline_parse_workers = _env('pipeline_parse_workers', 1, int)
+    parse_in_processes = _env('parse_in_processes', False, _flag)
+
+    # HTML extraction, one of lib.extractors.BACKENDS or None for the
+    # fastest installed
+    extractor_backend = _env('extractor_backend', None)
+
+    # Buffered mongo writes
+    writer_batch_size = _env('writer_batch_size', 1000, int)
+    writer_flush_interval = _env('writer_flush_interval', 5, float)
+
+    # Mongo connection, one pooled client per process
+    mongo_uri = _env('mongo_uri', 'mongodb://localhost:27017/')
+    mongo_max_pool_size = _env('mongo_max_pool_size', 100, int)
+    mongo_min_pool_size = _env('mongo_min_pool_size', 0, int)
+
+    # Distributed workers, a lease is the seconds a claimed url stays
+    # with a worker that stopped sending heartbeats
+    worker_claim_size = _env('worker_claim_size', 50, int)
+    worker_lease = _env('worker_lease', 300, float)
+    worker_idle_wait = _env('worker_idle_wait', 30, float)
+
+    # Proxy scoring
+    proxy_score_decay = _env('proxy_score_decay', 0.3, float)
+    proxy_prior_latency = _env('proxy_prior_latency', 5, float)
+    proxy_prior_success = _env('proxy_prior_success', 0.75, float)
+    proxy_quarantine = _env('proxy_quarantine', 30, float)
+    proxy_max_quarantine = _env('proxy_max_quarantine', 1800, float)
+
+    # Retries, the deadline is in seconds from the start of a run, no
+    # url is started or retried after it and 0 turns it off
+    retry_attempts = _env('retry_attempts', 4, int)
+    retry_base_delay = _env('retry_base_delay', 1, float)
+    retry_max_delay = _env('retry_max_delay', 30, float)
+    retry_deadline = _env('retry_deadline', 14400, float)
+
+    # Request hedging
+    fetch_hedge = _env('fetch_hedge', False, _flag)
+    fetch_hedge_percentile = _env('fetch_hedge_percentile', 0.95, float)
+    fetch_hedge_limit = _env('fetch_hedge_limit', 200, int)
+    fetch_hedge_min_samples = _env('fetch_hedge_min_samples', 20, int)
+    fetch_latency_window = _env('fetch_latency_window', 500, int)
+
+    # Proxy validation
+    proxy_probe_url = _env(
+        'proxy_probe_url', 'https://www.expedia.com/robots.txt')
+    proxy_probe_concurrency = _env('proxy_probe_concurrency', 2000, int)
+    proxy_probe_timeout = _env('proxy_probe_timeout', 15, float)
+    proxy_probe_connect_timeout = _env('proxy_probe_connect_timeout', 5, float)
+    # File descriptors kept free for everything else while probing,
+    # probes are capped to the rest of RLIMIT_NOFILE
+    proxy_probe_reserved_fds = _env('proxy_probe_reserved_fds', 128, int)
+    # Failed probes in a row before a saved proxy is dropped
+    proxy_probe_max_failures = _env('proxy_probe_max_failures', 3, int)
+
+    # Proxy refresher, running scrapes reload the saved list every
+    # proxy_reload_interval seconds
+    proxy_reload_interval = _env('proxy_reload_interval', 60, float)
+    proxy_refresh_interval = _env('proxy_refresh_interval', 900, float)
+    proxy_refresh_retry = _env('proxy_refresh_retry', 60, float)
+    proxy_min_pool = _env('proxy_min_pool', 50, int)
+
+    # Response cache, a TTL of 0 turns it off
+    cache_path = _env('cache_path', os.path.join(
+        os.path.expanduser('~'), '.cache', 'airtime', 'responses.sqlite3'))
+    cache_ttl = _env('cache_ttl', 1800, float)
+    cache_max_bytes = _env('cache_max_bytes', 1024 ** 3, int)
+
+    # Seconds before the airport registry reads the collection again
+    airport_ttl = _env('airport_ttl', 3600, float)
+
+    # Airport distance matrix, rebuilt whenever the airports change
+    distance_matrix_dir = _env('distance_matrix_dir', os.path.join(
+        os.path.expanduser('~'), '.cache', 'airtime', 'distances'))
+
+    # Run metrics are saved to scraping.runStats, and also written in
+    # the Prometheus text format to this file when it is set
+    metrics_prometheus_path = _env('metrics_prometheus_path', '')
+
+    # Profiles saved by --profile, and how many functions are printed
+    profile_dir = _env('profile_dir', os.path.join(
+        os.path.expanduser('~'), '.cache', 'airtime', 'profiles'))
+    profile_top = _env('profile_top', 30, int)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+'''
+    Process wide registry of the airports in airports.airportCodes
+
+    The collection is read once per process into small __slots__
+    records indexed by code and read again only after a TTL, so
+    building a scraper per origin does not query mongo each time.
+    Once the TTL passes the airports are read again on a background
+    thread while lookups keep using the current ones, so a lookup
+    from the event loop never waits on mongo. The registry also
+    hands out the distance matrix for its airports
+'''
+
+import logging
+import threading
+import time
+
+from configs.config import Configs
+from lib.decorator import connect
+
+AIRPORT_FIELDS = {
+    'code': True, 'city': True, 'country': True, 'airportName': True,
+    'latitude': True, 'longitude': True
+}
+
+
+class airport(object):
+    '''
+        Location and names of one airport
+    '''
+
+    __slots__ = (
+        'code', 'city', 'country', 'airport_name', 'latitude', 'longitude'
+    )
+
+    def __init__(
+        self, code=None, city='', country='', airport_name=None,
+        latitude=None, longitude=None
+    ):
+
+        self.code = code
+        self.city = city
+        self.country = country
+        self.airport_name = airport_name
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def location(self):
+
+        return '{city}, {country}'.format(
+            city=self.city, country=self.country)
+
+    @property
+    def point(self):
+
+        return [self.latitude, self.longitude]
+
+    @classmethod
+    def from_document(cls, document):
+
+        return cls(
+            code=document.get('code'),
+            city=document.get('city') or '',
+            country=document.get('country') or '',
+            airport_name=document.get('airportName'),
+            latitude=document.get('latitude'),
+            longitude=document.get('longitude')
+        )
+
+
+UNKNOWN_AIRPORT = airport()
+
+
+class airportRegistry(object):
+    '''
+        Airports by code, reloaded from mongo once they are older
+        than ttl seconds
+
+    Args:
+        ttl(float): seconds before the airports are read again
+    '''
+
+    def __init__(self, ttl=None):
+
+        self.ttl = Configs.airport_ttl if ttl is None else ttl
+
+        self._airports = {}
+        self._distances = None
+        self._loaded = None
+        self._refreshing = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+
+        if self._loaded is None:
+            with self._lock:
+                if self._loaded is None:
+                    self.refresh()
+        elif time.monotonic() - self._loaded > self.ttl:
+            self._refresh_in_background()
+
+        return self._airports
+
+    def _refresh_in_background(self):
+
+        with self._lock:
+
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+
+            self._refreshing = threading.Thread(
+                target=self._background_refresh, name='airportRegistry',
+                daemon=True)
+            self._refreshing.start()
+
+    def _background_refresh(self):
+
+        try:
+            self.refresh()
+        except Exception:
+            logging.exception('Could not refresh airports')
+            # Keep the current airports and try again after another ttl
+            self._loaded = time.monotonic()
+
+    def refresh(self):
+        '''
+            Reads every airport from mongo
+        '''
+
+        airports = {
+            i['code']: airport.from_document(i)
+            for i in pull_airports() if i.get('code')
+        }
+
+        # A matrix already in use is replaced by one for the new
+        # airports here, not on the next lookup
+        distances = None
+
+        if self._distances is not None:
+            distances = _load_distances(airports)
+
+        self._airports = airports
+        self._distances = distances
+        self._loaded = time.monotonic()
+
+        logging.info('Loaded {number} airports'.format(number=len(airports)))
+
+    def __len__(self):
+
+        return len(self._current())
+
+    def __contains__(self, code):
+
+        return code in self._current()
+
+    def get(self, code, default=UNKNOWN_AIRPORT):
+        '''
+            The airport for a code, an airport with no names or
+            location if it is unknown
+        '''
+
+        return self._current().get(code, default)
+
+    def codes(self):
+
+        return list(self._current())
+
+    def coordinates(self):
+        '''
+            Dictionary {code: (latitude, longitude)}
+        '''
+
+        return _coordinates(self._current())
+
+    def distances(self):
+        '''
+            Distance matrix for the current airports, mapped again
+            after each refresh and only rebuilt if they changed
+
+            The first call builds or maps the matrix, call it before
+            anything latency sensitive starts
+        '''
+
+        airports = self._current()
+        distances = self._distances
+
+        if distances is None:
+            distances = _load_distances(airports)
+            self._distances = distances
+
+        return distances
+
+
+def _coordinates(airports):
+
+    return {code: (i.latitude, i.longitude) for code, i in airports.items()}
+
+
+def _load_distances(airports):
+
+    from lib.distances import load_distance_matrix
+
+    return load_distance_matrix(_coordinates(airports))
+
+
+@connect('MONGO')
+def pull_airports(client):
+    '''
+        Pulls every airport document with the fields the registry keeps
+    '''
+
+    return list(client.airports.airportCodes.find({}, AIRPORT_FIELDS))
+
+
+_registry = None
+
+
+def airport_registry():
+    '''
+        The registry shared by everything in this process
+    '''
+
+    global _registry
+
+    if _registry is None:
+        _registry = airportRegistry()
+
+    return _registry
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+'''
+    On-disk cache of loaded web pages
+
+    Bodies are stored zlib compressed in a sqlite file. Entries expire
+    after a TTL, and once the compressed bodies pass a size limit the
+    least recently used entries are evicted until the cache is back
+    under 90% of the limit
+'''
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from configs.config import Configs
+
+
+class responseCache(object):
+    '''
+        Size bounded, expiring store of page bodies keyed by any string
+
+    Args:
+        path(str): sqlite file to keep the cache in
+        ttl(float): seconds an entry stays valid
+        max_bytes(int): compressed bytes kept before evicting
+    '''
+
+    def __init__(self, path=None, ttl=None, max_bytes=None):
+
+        self.path = path or Configs.cache_path
+        self.ttl = Configs.cache_ttl if ttl is None else ttl
+        self.max_bytes = max_bytes or Configs.cache_max_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, created REAL, accessed REAL, '
+            'size INTEGER, encoding TEXT, body BLOB)')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed '
+            'ON responses (accessed)')
+        self._db.commit()
+
+        self.size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        '''
+            Returns (body, encoding) for a fresh entry, None otherwise
+        '''
+
+        now = time.time()
+
+        with self._lock:
+
+            row = self._db.execute(
+                'SELECT created, size, encoding, body FROM responses '
+                'WHERE key = ?', (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            created, size, encoding, body = row
+
+            if now - created > self.ttl:
+                self._db.execute(
+                    'DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+                self.size -= size
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?',
+                (now, key))
+            self._db.commit()
+            self.hits += 1
+
+        return zlib.decompress(body), encoding
+
+    def put(self, key, body, encoding=None):
+        '''
+            Stores a page body, evicting old entries if over size
+        '''
+
+        compressed = zlib.compress(body)
+        now = time.time()
+
+        with self._lock:
+
+            row = self._db.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, created, accessed, size, encoding, body) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, now, now, len(compressed), encoding, compressed))
+
+            self.size += len(compressed) - (row[0] if row else 0)
+
+            if self.size > self.max_bytes:
+                self._evict()
+
+            self._db.commit()
+
+    def delete(self, key):
+        '''
+            Removes an entry if there is one
+        '''
+
+        with self._lock:
+
+            row = self._db.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+
+            if row is None:
+                return
+
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._db.commit()
+            self.size -= row[0]
+
+    def _evict(self):
+
+        cutoff = time.time() - self.ttl
+        evicted = self._db.execute(
+            'DELETE FROM responses WHERE created < ?', (cutoff,)).rowcount
+
+        self.size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        for key, size in self._db.execute(
+            'SELECT key, size FROM responses ORDER BY accessed'
+        ).fetchall():
+
+            if self.size <= self.max_bytes * 0.9:
+                break
+
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.size -= size
+            evicted += 1
+
+        logging.info('Evicted {number} cached responses'.format(
+            number=evicted))
+
+    def close(self):
+
+        with self._lock:
+            self._db.close()
@@ -4,15 +4,28 @@
     throughout the project
 '''
 
+import atexit
 import functools
 import logging
+import os
+import threading
 from datetime import datetime
 
+from configs.config import Configs
+
+_clients = {}
+_clients_lock = threading.Lock()
+_close_registered = False
+
 
 def execute(f):
     '''
         Decorator to log script run times
 
+        Calling the decorated function with profile set to a
+        directory runs it under cProfile, saving the profile there
+        and printing its hottest functions
+
     Args:
         f(function): Function you wish to wrap
 
@@ -20,12 +33,19 @@ def execute(f):
         Decorated function that logs how much time a script takes
     '''
 
-    def execute_function(*args, **kwargs):
+    def execute_function(*args, profile=None, **kwargs):
 
         start_time = datetime.now()
         logging.info('-- Starting script -- {time}'.format(time=start_time))
         try:
-            f(*args, **kwargs)
+            if profile is None:
+                f(*args, **kwargs)
+            else:
+                from lib.profiling import profile_call, profile_name
+
+                profile_call(
+                    f, *args, directory=profile,
+                    name=profile_name(f.__name__), **kwargs)
         except Exception:
             raise
 
@@ -37,11 +57,83 @@ def execute(f):
     return execute_function
 
 
+def get_client(db):
+    '''
+        Returns the shared client for a database, creating it on
+        first use
+
+        Clients are kept per process, a forked child builds its own
+        instead of reusing sockets inherited from the parent. They
+        are closed by close_clients when the interpreter exits
+
+    Args:
+        db(str): Database you wish to connect to
+
+    Returns:
+        Database client
+    '''
+
+    pid = os.getpid()
+    owner, client = _clients.get(db, (None, None))
+
+    if owner == pid:
+        return client
+
+    global _close_registered
+
+    with _clients_lock:
+
+        if not _close_registered:
+            atexit.register(close_clients)
+            _close_registered = True
+
+        owner, client = _clients.get(db, (None, None))
+
+        if owner != pid:
+
+            if db == 'MONGO':
+
+                from pymongo import MongoClient
+
+                client = MongoClient(
+                    Configs.mongo_uri,
+                    maxPoolSize=Configs.mongo_max_pool_size,
+                    minPoolSize=Configs.mongo_min_pool_size,
+                    connect=False)
+
+            else:
+                raise Exception('This database currently not supported! ' + db)
+
+            _clients[db] = (pid, client)
+
+    return client
+
+
+def close_clients():
+    '''
+        Closes every client created by this process, registered to
+        run at exit by the first get_client call. Clients inherited
+        from a parent process are dropped without closing them
+    '''
+
+    with _clients_lock:
+
+        pid = os.getpid()
+
+        for db, (owner, client) in list(_clients.items()):
+            if owner == pid:
+                client.close()
+            del _clients[db]
+
+
 def connect(db):
     '''
         Connects to a database and passes a cursor to
         a function to be used
 
+        The client is shared across the process so every call
+        reuses the same connection pool
+
     Args:
         db(str): Database you wish to connect to
 
@@ -54,15 +146,7 @@ def connect(db):
         @functools.wraps(f)
         def wrap_connection(*args, **kwargs):
 
-            if db == 'MONGO':
+            return f(get_client(db), *args, **kwargs)
 
-                from pymongo import MongoClient
-
-                client = MongoClient('mongodb://localhost:27017/')
-
-                return f(client, *args, **kwargs)
-
-            else:
-                raise Exception('This database currently not supported! ' + db)
         return wrap_connection
     return decorated_function
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+'''
+    Precomputed distances between every pair of airports
+
+    The matrix is float32 miles saved as a .npy file and memory
+    mapped, so it is read straight from the page cache and shared
+    by every process on the machine. Files are named after a
+    fingerprint of the airport codes and coordinates: a changed
+    airport collection gets a new matrix, an unchanged one reuses
+    the saved file without recomputing anything
+'''
+
+import glob
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from configs.config import Configs
+from lib import geo
+
+
+def airport_fingerprint(coordinates):
+    '''
+        Hash of every airport code with its coordinates
+
+    Args:
+        coordinates(dict): {code: (latitude, longitude)}
+    '''
+
+    digest = hashlib.sha1()
+
+    for code in sorted(coordinates):
+        latitude, longitude = coordinates[code]
+        digest.update('{code}:{latitude!r}:{longitude!r};'.format(
+            code=code, latitude=latitude, longitude=longitude
+        ).encode('utf-8'))
+
+    return digest.hexdigest()[:16]
+
+
+class distanceMatrix(object):
+    '''
+        Miles between airports, looked up by code
+
+    Args:
+        codes(list): airport codes in matrix order
+        matrix(array): (n, n) float32 distances
+    '''
+
+    def __init__(self, codes, matrix):
+
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.matrix = matrix
+
+    def __len__(self):
+
+        return len(self.codes)
+
+    def distance(self, from_code, to_code):
+        '''
+            Miles from one airport to another, None if either is
+            unknown or has no location
+        '''
+
+        i = self.index.get(from_code)
+        j = self.index.get(to_code)
+
+        if i is None or j is None:
+            return None
+
+        distance = float(self.matrix[i, j])
+
+        if distance != distance:
+            return None
+
+        return distance
+
+
+def _paths(directory, fingerprint):
+
+    base = os.path.join(directory, 'distances-' + fingerprint)
+
+    return base + '.npy', base + '.codes.json'
+
+
+def build_distance_matrix(coordinates, directory, fingerprint):
+    '''
+        Computes and saves the matrix for a set of airports, then
+        removes matrices saved for older airport sets
+
+    Returns:
+        Path of the saved matrix
+    '''
+
+    matrix_path, codes_path = _paths(directory, fingerprint)
+    codes = sorted(coordinates)
+    points = [coordinates[i] for i in codes]
+
+    logging.info('Building distance matrix for {number} airports'.format(
+        number=len(codes)))
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Both files are written under a temporary name so a reader
+    # never sees a half written one
+    partial_path = '{path}.{pid}.partial'.format(
+        path=codes_path, pid=os.getpid())
+    with open(partial_path, 'w') as codes_file:
+        json.dump(codes, codes_file)
+    os.replace(partial_path, codes_path)
+
+    partial_path = '{path}.{pid}.partial'.format(
+        path=matrix_path, pid=os.getpid())
+    matrix = np.lib.format.open_memmap(
+        partial_path, mode='w+', dtype=np.float32,
+        shape=(len(codes), len(codes)))
+    geo.pairwise_distances(points, miles=True, out=matrix)
+    matrix.flush()
+    del matrix
+    os.replace(partial_path, matrix_path)
+
+    for path in glob.glob(os.path.join(directory, 'distances-*')):
+        if fingerprint not in os.path.basename(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    return matrix_path
+
+
+def load_distance_matrix(coordinates, directory=None):
+    '''
+        Maps the saved matrix for these airports, building it first
+        if the airports changed since it was saved
+
+    Args:
+        coordinates(dict): {code: (latitude, longitude)}
+        directory(str): where matrices are kept
+
+    Returns:
+        distanceMatrix
+    '''
+
+    directory = directory or Configs.distance_matrix_dir
+    fingerprint = airport_fingerprint(coordinates)
+    matrix_path, codes_path = _paths(directory, fingerprint)
+
+    if not os.path.exists(matrix_path):
+        build_distance_matrix(coordinates, directory, fingerprint)
+
+    with open(codes_path) as codes_file:
+        codes = json.load(codes_file)
+
+    logging.info(
+        'Loaded distance matrix {fingerprint} for {number} airports'
+        .format(fingerprint=fingerprint, number=len(codes)))
+
+    return distanceMatrix(codes, np.load(matrix_path, mmap_mode='r'))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+'''
+    Pulls listing fields out of search result pages
+
+    The listing region is cut out of the raw HTML before parsing so
+    the rest of the page is never turned into a tree, then every field
+    of a listing is collected in one walk over its elements
+
+    Backends, fastest first:
+        - selectolax (lexbor parser)
+        - lxml
+        - bs4 (always available, used as the fallback)
+'''
+
+import logging
+import re
+
+from configs.config import Configs
+
+BACKENDS = ('selectolax', 'lxml', 'bs4')
+
+
+def find_region(html, tag, region_id):
+    '''
+        Cuts the element with the given id out of an HTML string
+
+    Args:
+        html(str): full page
+        tag(str): tag name of the region element
+        region_id(str): id attribute of the region element
+
+    Returns:
+        HTML of the region, None if it cannot be found
+    '''
+
+    opening = re.search(
+        r'<{tag}\b[^>]*\bid=["\']{id}["\']'.format(
+            tag=tag, id=re.escape(region_id)),
+        html)
+
+    if not opening:
+        return None
+
+    depth = 0
+    tags = re.compile(r'<(/?){tag}\b[^>]*>'.format(tag=tag), re.IGNORECASE)
+
+    for match in tags.finditer(html, opening.start()):
+
+        depth += -1 if match.group(1) else 1
+
+        if not depth:
+            return html[opening.start():match.end()]
+
+    return html[opening.start():]
+
+
+class listingExtractor(object):
+    '''
+        Extracts every listing in a result page region
+
+    Args:
+        region_tag(str): tag of the element holding all listings
+        region_id(str): id of the element holding all listings
+        listing_tag(str): tag of a single listing
+        listing_class(str): space separated classes of a listing
+        fields(dict): data-test-id -> tag name, read as stripped text
+        attributes(tuple): attribute names read as values
+        backend(str): one of BACKENDS, fastest installed if not given
+    '''
+
+    def __init__(
+        self, region_tag, region_id, listing_tag, listing_class, fields,
+        attributes=(), backend=None
+    ):
+
+        self.region_tag = region_tag
+        self.region_id = region_id
+        self.listing_tag = listing_tag
+        self.listing_classes = frozenset(listing_class.split())
+        self.fields = dict(fields)
+        self.attributes = tuple(attributes)
+        self.backend = load_backend(backend or Configs.extractor_backend)
+
+        self._listing_selector = listing_tag + ''.join(
+            '.' + i for i in listing_class.split())
+        self._field_selector = ', '.join(
+            ['[data-test-id]'] +
+            ['[{attribute}]'.format(attribute=i) for i in self.attributes])
+
+        if self.backend == 'lxml':
+            from lxml import etree
+            self._listing_xpath = etree.XPath(
+                './/{tag}[{classes}]'.format(
+                    tag=listing_tag,
+                    classes=' and '.join(
+                        'contains(concat(" ", normalize-space(@class), " "),'
+                        ' " {name} ")'.format(name=i)
+                        for i in listing_class.split())))
+            self._field_xpath = etree.XPath(
+                './/*[{conditions}]'.format(conditions=' or '.join(
+                    '@' + i for i in ('data-test-id',) + self.attributes)))
+
+    def extract(self, html):
+        '''
+            Extracts the fields of every listing on a page
+
+        Args:
+            html(str): full page
+
+        Returns:
+            List of dicts, one per listing in page order, keyed by
+            data-test-id and attribute name
+        '''
+
+        region = find_region(html, self.region_tag, self.region_id)
+
+        if region is None:
+            return []
+
+        return getattr(self, '_extract_' + self.backend)(region)
+
+    def _collect(self, elements):
+
+        values = {}
+
+        for tag, attributes, text in elements:
+
+            test_id = attributes.get('data-test-id')
+
+            if test_id in self.fields and test_id not in values:
+                if self.fields[test_id] == tag:
+                    values[test_id] = text().strip()
+
+            for attribute in self.attributes:
+                value = attributes.get(attribute)
+                if value is not None and attribute not in values:
+                    values[attribute] = value
+
+        return values
+
+    def _extract_selectolax(self, region):
+
+        from selectolax.lexbor import LexborHTMLParser
+
+        listings = LexborHTMLParser(region).css(self._listing_selector)
+
+        return [
+            self._collect((
+                (node.tag, node.attributes,
+                 lambda node=node: node.text(deep=True))
+                for node in listing.css(self._field_selector)))
+            for listing in listings
+        ]
+
+    def _extract_lxml(self, region):
+
+        import lxml.html
+
+        listings = self._listing_xpath(lxml.html.fromstring(region))
+
+        return [
+            self._collect((
+                (node.tag, node.attrib, node.text_content)
+                for node in self._field_xpath(listing)))
+            for listing in listings
+        ]
+
+    def _extract_bs4(self, region):
+
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(region, 'html.parser')
+        listings = [
+            i for i in soup.find_all(self.listing_tag)
+            if self.listing_classes.issubset(i.get('class') or ())
+        ]
+
+        wanted = ('data-test-id',) + self.attributes
+
+        return [
+            self._collect((
+                (node.name, node.attrs, node.get_text)
+                for node in listing.find_all(
+                    lambda node: any(i in node.attrs for i in wanted))))
+            for listing in listings
+        ]
+
+
+def load_backend(backend=None):
+    '''
+        Picks the extraction backend to use
+
+    Args:
+        backend(str): requested backend, fastest installed if not given
+
+    Returns:
+        Name of a backend that can be imported
+    '''
+
+    candidates = [backend] if backend else list(BACKENDS)
+
+    for candidate in candidates:
+
+        if candidate not in BACKENDS:
+            raise Exception('Unknown extractor backend! ' + candidate)
+
+        try:
+            if candidate == 'selectolax':
+                import selectolax.lexbor  # noqa: F401
+            elif candidate == 'lxml':
+                import lxml.html  # noqa: F401
+            return candidate
+        except ImportError:
+            logging.info('Extractor backend {backend} not installed'.format(
+                backend=candidate))
+
+    return 'bs4'
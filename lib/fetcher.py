@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+'''
+    Non-blocking HTTP fetch engine used to load web pages
+    through the proxy list
+
+    Every proxy gets its own connection pool so keep-alive
+    connections are reused per proxy, and a global semaphore
+    caps the number of requests in flight for the whole run. Every
+    attempt at a url first waits for its site's rate limit
+
+    With hedging on, a request still running past a percentile of
+    recent latencies gets a duplicate through a second proxy and the
+    first good answer wins
+'''
+
+import asyncio
+import collections
+import logging
+import time
+
+import aiohttp
+
+from configs.config import Configs
+from lib.proxies import proxyPool, proxy_url
+from lib.ratelimit import rateLimiter
+from lib.retry import retryScheduler
+
+
+class fetchedPage(object):
+    '''
+        A loaded web page with its body already read into memory
+    '''
+
+    __slots__ = (
+        'url', 'status', 'body', 'encoding', 'proxy', 'elapsed', 'cached'
+    )
+
+    def __init__(
+        self, url, status, body, encoding=None, proxy=None, elapsed=None,
+        cached=False
+    ):
+
+        self.url = url
+        self.status = status
+        self.body = body
+        self.encoding = encoding
+        self.proxy = proxy
+        self.elapsed = elapsed
+        self.cached = cached
+
+    @property
+    def text(self):
+
+        return self.body.decode(self.encoding or 'utf-8', errors='replace')
+
+
+class fetchEngine(object):
+    '''
+        Loads web pages concurrently on the running event loop
+
+    Args:
+        proxies(proxyPool or list): proxies to spread requests over,
+            scored by how each request through them goes
+        concurrency(int): max requests in flight across all proxies
+        per_proxy_limit(int): max open connections per proxy
+        timeout(float): total seconds allowed per request
+        retries(retryScheduler): retry budget for failed urls
+        hedge(bool): send duplicate requests for slow urls
+        hedge_limit(int): most duplicate requests sent in this run
+        cache(responseCache): pages are served from and saved to it
+        cache_key(callable): cache_key(url) -> key the page is cached by
+        cache_on_fetch(bool): save every loaded page to the cache, off
+            when the caller saves pages with cache_page once it knows
+            they are worth keeping
+        rate_limit(float or rateLimiter): requests per second sent to
+            each site, or a limiter shared with the caller
+        metrics(runMetrics): records every request and cache hit
+    '''
+
+    def __init__(
+        self, proxies, concurrency=None, per_proxy_limit=None, timeout=None,
+        retries=None, hedge=None, hedge_limit=None, cache=None, cache_key=None,
+        rate_limit=None, metrics=None, cache_on_fetch=True
+    ):
+
+        self.proxies = (
+            proxies if isinstance(proxies, proxyPool) else proxyPool(proxies))
+        self.concurrency = concurrency or Configs.fetch_concurrency
+        self.per_proxy_limit = (
+            per_proxy_limit or Configs.fetch_per_proxy_limit)
+        self.timeout = timeout or Configs.fetch_timeout
+        self.connect_timeout = min(
+            Configs.fetch_connect_timeout, self.timeout)
+        self.retries = retries or retryScheduler()
+
+        self.hedge = Configs.fetch_hedge if hedge is None else hedge
+        self.hedge_limit = (
+            Configs.fetch_hedge_limit if hedge_limit is None else hedge_limit)
+        self.hedges = 0
+        self.latencies = collections.deque(
+            maxlen=Configs.fetch_latency_window)
+
+        self.cache = cache
+        self.cache_key = cache_key or (lambda url: url)
+        self.cache_on_fetch = cache_on_fetch
+        self.rate_limiter = (
+            rate_limit if isinstance(rate_limit, rateLimiter)
+            else rateLimiter(rate_limit))
+        self.metrics = metrics
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._sessions = {}
+
+    async def __aenter__(self):
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+
+        await self.close()
+
+    async def close(self):
+        '''
+            Closes every proxy connection pool
+        '''
+
+        sessions, self._sessions = self._sessions, {}
+
+        for session in sessions.values():
+            await session.close()
+
+    def _session(self, proxy):
+
+        session = self._sessions.get(proxy)
+
+        if session is None:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.per_proxy_limit, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, sock_connect=self.connect_timeout))
+            self._sessions[proxy] = session
+
+        return session
+
+    def choose_proxy(self, exclude=()):
+        '''
+            Picks the proxy to send the next request through
+        '''
+
+        return self.proxies.choose(exclude=exclude)
+
+    async def fetch(self, url, proxy=None):
+        '''
+            Loads a single url
+
+        Args:
+            url(str): url to load
+            proxy(str): proxy to use, chosen from the pool if not given
+
+        Returns:
+            fetchedPage when the url returns a 200, otherwise None
+        '''
+
+        proxy = proxy or self.choose_proxy()
+
+        async with self._semaphore:
+
+            start_time = time.monotonic()
+
+            try:
+                async with self._session(proxy).get(
+                    url, proxy=proxy_url(proxy)
+                ) as response:
+
+                    body = await response.read()
+                    elapsed = time.monotonic() - start_time
+
+                    if response.status != 200:
+                        logging.info(
+                            'Response {status} from {url} using proxy: '
+                            '{proxy}'.format(
+                                status=response.status, url=url,
+                                proxy=proxy))
+                        self.proxies.record_failure(proxy, elapsed)
+                        self._record(proxy, elapsed, len(body), False)
+                        return None
+
+                    logging.info(
+                        'Getting response: {url}'.format(url=url) +
+                        ' using proxy: {proxy}'.format(proxy=proxy))
+                    self.proxies.record_success(proxy, elapsed)
+                    self.latencies.append(elapsed)
+                    self._record(proxy, elapsed, len(body), True)
+
+                    return fetchedPage(
+                        url=url,
+                        status=response.status,
+                        body=body,
+                        encoding=response.charset,
+                        proxy=proxy,
+                        elapsed=elapsed
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                logging.info('Response with {proxy} timed out!'.format(
+                    proxy=proxy))
+                elapsed = time.monotonic() - start_time
+                self.proxies.record_failure(proxy, elapsed)
+                self._record(proxy, elapsed, 0, False)
+                return None
+
+    def _record(self, proxy, elapsed, size, ok):
+
+        if self.metrics is not None:
+            self.metrics.record_request(proxy, elapsed, size, ok)
+
+    def can_hedge(self):
+        '''
+            Whether hedging is on and its budget is not spent
+        '''
+
+        return (
+            self.hedge and
+            self.hedges < self.hedge_limit and
+            len(self.proxies) > 1
+        )
+
+    def hedge_threshold(self):
+        '''
+            Seconds after which a request gets a hedge, None until
+            enough latencies have been seen
+        '''
+
+        if len(self.latencies) < Configs.fetch_hedge_min_samples:
+            return None
+
+        latencies = sorted(self.latencies)
+        index = int(Configs.fetch_hedge_percentile * (len(latencies) - 1))
+
+        return latencies[index]
+
+    async def fetch_hedged(self, url, proxy):
+        '''
+            Loads a url through proxy, sending a duplicate through a
+            second proxy if it is slower than the hedge threshold
+
+        Returns:
+            The first fetchedPage to come back, None if both failed
+        '''
+
+        primary = asyncio.ensure_future(self.fetch(url, proxy))
+        start_time = time.monotonic()
+
+        while True:
+
+            if not self.can_hedge():
+                return await primary
+
+            threshold = self.hedge_threshold()
+            waited = time.monotonic() - start_time
+
+            done, _ = await asyncio.wait(
+                {primary},
+                timeout=1.0 if threshold is None else threshold - waited)
+
+            if done:
+                return primary.result()
+
+            if threshold is not None and self.can_hedge():
+                break
+
+        # Chosen before waiting on the rate limiter, a reload while it
+        # waits cannot leave the hedge without a proxy then
+        hedge_proxy = self.choose_proxy(exclude={proxy})
+
+        if hedge_proxy == proxy:
+            # The pool shrank to the primary's proxy, keep waiting on it
+            return await primary
+
+        self.hedges += 1
+        logging.info('Hedging {url} after {seconds:.1f}s'.format(
+            url=url, seconds=time.monotonic() - start_time))
+
+        await self.rate_limiter.acquire(url)
+
+        if primary.done() and primary.result() is not None:
+            return primary.result()
+
+        pending = {
+            primary,
+            asyncio.ensure_future(self.fetch(url, hedge_proxy))
+        }
+
+        try:
+            while pending:
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.result() is not None:
+                        return task.result()
+
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def fetch_with_retries(self, url):
+        '''
+            Loads a url, retrying through a different proxy each time
+            while the retry budget allows
+
+        Returns:
+            fetchedPage, None if every attempt failed
+        '''
+
+        tried = set()
+        attempt = 0
+
+        while True:
+
+            attempt += 1
+
+            await self.rate_limiter.acquire(url)
+
+            # The pool may have been reloaded while this waited
+            if len(tried) >= len(self.proxies):
+                tried.clear()
+
+            proxy = self.choose_proxy(exclude=tried)
+            page = await self.fetch_hedged(url, proxy)
+
+            if page is not None:
+                return page
+
+            tried.add(proxy)
+
+            if not self.retries.should_retry(attempt):
+                logging.info(
+                    'Giving up on {url} after {attempt} attempts'
+                    .format(url=url, attempt=attempt))
+                return None
+
+            await asyncio.sleep(self.retries.delay(attempt))
+
+    async def _in_executor(self, function, *args):
+
+        # sqlite reads and writes and zlib would block the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, function, *args)
+
+    async def fetch_cached(self, url):
+        '''
+            Serves a url from the cache, loading it on a miss and
+            caching it when cache_on_fetch is on
+        '''
+
+        if self.cache is None:
+            return await self.fetch_with_retries(url)
+
+        cached = await self._in_executor(self.cache.get, self.cache_key(url))
+
+        if cached is not None:
+            if self.metrics is not None:
+                self.metrics.record_cache_hit()
+            body, encoding = cached
+            return fetchedPage(
+                url=url, status=200, body=body, encoding=encoding,
+                elapsed=0.0, cached=True)
+
+        page = await self.fetch_with_retries(url)
+
+        if page is not None and self.cache_on_fetch:
+            await self.cache_page(page)
+
+        return page
+
+    async def cache_page(self, page):
+        '''
+            Saves a loaded page to the cache
+        '''
+
+        if self.cache is not None and not page.cached:
+            await self._in_executor(
+                self.cache.put, self.cache_key(page.url), page.body,
+                page.encoding)
+
+    async def uncache_page(self, page):
+        '''
+            Drops a page from the cache, e.g. one that turned out to
+            hold no results
+        '''
+
+        if self.cache is not None and page.cached:
+            await self._in_executor(
+                self.cache.delete, self.cache_key(page.url))
+
+    async def _fetch_pair(self, url):
+
+        return url, await self.fetch_cached(url)
+
+    async def stream(self, urls):
+        '''
+            Loads urls and yields (url, page) pairs as soon as each one
+            completes, page is None when the url could not be loaded
+
+            Only ``concurrency`` requests are scheduled at a time so
+            ``urls`` can be a lazy iterator of any length. An iterator
+            that has to wait for urls, e.g. on mongo, should be an
+            async iterator so it does not block the event loop
+
+            Once the retry deadline has passed no new url is started,
+            the ones in flight finish and the rest are left for a
+            resumed run
+
+        Args:
+            urls(iterable or async iterable): urls to load
+        '''
+
+        is_async = hasattr(urls, '__aiter__')
+        urls = urls.__aiter__() if is_async else iter(urls)
+        pending = set()
+        exhausted = False
+
+        try:
+            while True:
+
+                while not exhausted and len(pending) < self.concurrency:
+                    if self.retries.expired():
+                        logging.warning(
+                            'Run deadline passed, not starting the '
+                            'remaining urls')
+                        exhausted = True
+                        break
+                    try:
+                        if is_async:
+                            url = await urls.__anext__()
+                        else:
+                            url = next(urls)
+                    except (StopIteration, StopAsyncIteration):
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self._fetch_pair(url)))
+
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if is_async and hasattr(urls, 'aclose'):
+                await urls.aclose()
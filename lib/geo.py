@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+'''
+    Great circle distances between decimal degree coordinates,
+    computed on whole NumPy arrays at once
+
+    Missing coordinates, None or NaN, give a NaN distance instead
+    of raising so one airport without a location does not stop a
+    batch
+'''
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_RADIUS_MILES = 3959.0
+
+
+def _radius(miles):
+
+    return EARTH_RADIUS_MILES if miles else EARTH_RADIUS_KM
+
+
+def _radians(values):
+
+    # float conversion turns None into NaN
+    return np.radians(np.asarray(values, dtype=np.float64))
+
+
+def haversine(
+    origin_lat, origin_lon, destination_lat, destination_lon, miles=False
+):
+    '''
+        Distances between origins and destinations given as separate
+        latitude and longitude arrays, broadcast against each other
+
+    Args:
+        origin_lat(array like): origin latitudes
+        origin_lon(array like): origin longitudes
+        destination_lat(array like): destination latitudes
+        destination_lon(array like): destination longitudes
+        miles(bool): return distances in miles instead of kilometers
+
+    Returns:
+        float64 array of distances, NaN where a coordinate is missing
+    '''
+
+    lat1 = _radians(origin_lat)
+    lat2 = _radians(destination_lat)
+
+    return _haversine(
+        lat1, _radians(origin_lon), lat2, _radians(destination_lon),
+        np.cos(lat1), np.cos(lat2), _radius(miles))
+
+
+def _haversine(lat1, lon1, lat2, lon2, cos_lat1, cos_lat2, radius):
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+    )
+
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distances(origins, destinations, miles=False):
+    '''
+        Distances between pairs of [latitude, longitude] points
+
+    Args:
+        origins(array like): shape (..., 2) origin points
+        destinations(array like): shape (..., 2) destination points
+        miles(bool): return distances in miles instead of kilometers
+
+    Returns:
+        float64 array with the leading shape of the inputs
+    '''
+
+    origins = np.asarray(origins, dtype=np.float64)
+    destinations = np.asarray(destinations, dtype=np.float64)
+
+    return haversine(
+        origins[..., 0], origins[..., 1],
+        destinations[..., 0], destinations[..., 1],
+        miles=miles)
+
+
+def pairwise_distances(
+    points, miles=False, dtype=np.float64, out=None, block_size=1024
+):
+    '''
+        Distance between every pair of points
+
+        Rows are computed block_size at a time so the temporaries
+        stay small even for tens of thousands of points
+
+    Args:
+        points(array like): shape (n, 2) [latitude, longitude] points
+        miles(bool): return distances in miles instead of kilometers
+        dtype(numpy dtype): dtype of the result
+        out(array): (n, n) array to write into, e.g. a memory map,
+            a new array if not given
+        block_size(int): rows computed at a time
+
+    Returns:
+        (n, n) array where [i, j] is the distance from point i to j
+    '''
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    count = len(points)
+
+    if out is None:
+        out = np.empty((count, count), dtype=dtype)
+
+    latitudes = np.radians(points[:, 0])
+    longitudes = np.radians(points[:, 1])
+    cosines = np.cos(latitudes)
+    radius = _radius(miles)
+
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        out[start:stop] = _haversine(
+            latitudes[start:stop, np.newaxis],
+            longitudes[start:stop, np.newaxis],
+            latitudes, longitudes,
+            cosines[start:stop, np.newaxis], cosines, radius)
+
+    return out
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+'''
+    Declares the indexes the scraper and dashboard queries rely on,
+    creates them, and checks the query plans actually use them
+'''
+
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from lib.decorator import connect
+
+PRICED = {'price': {'$type': 'number'}}
+PRICED_PER_MILE = {'pricePerMile': {'$type': 'number'}}
+
+INDEXES = {
+    ('scraping', 'flights'): [
+        IndexModel(
+            [('timePulled', DESCENDING), ('price', ASCENDING)],
+            name='timePulled_price',
+            partialFilterExpression=PRICED),
+        IndexModel(
+            [('timePulled', DESCENDING), ('pricePerMile', ASCENDING)],
+            name='timePulled_pricePerMile',
+            partialFilterExpression=PRICED_PER_MILE),
+        IndexModel([('timePulled', DESCENDING)], name='timePulled'),
+    ],
+    ('scraping', 'runSummaries'): [
+        IndexModel([('timePulled', DESCENDING)], name='timePulled'),
+    ],
+    ('scraping', 'runs'): [
+        IndexModel(
+            [('status', ASCENDING), ('runTime', DESCENDING)],
+            name='status_runTime'),
+    ],
+    ('scraping', 'runUrls'): [
+        IndexModel(
+            [('run', ASCENDING), ('url', ASCENDING)],
+            name='run_url', unique=True),
+        IndexModel(
+            [('run', ASCENDING), ('status', ASCENDING),
+             ('priority', ASCENDING)],
+            name='run_status_priority'),
+    ],
+    ('airports', 'airportCodes'): [
+        IndexModel([('code', ASCENDING)], name='code', unique=True),
+    ],
+}
+
+# (db, collection, filter, sort) for the queries that must not scan
+QUERIES = [
+    ('scraping', 'flights', PRICED,
+     [('timePulled', DESCENDING), ('price', ASCENDING)]),
+    ('scraping', 'flights', PRICED_PER_MILE,
+     [('timePulled', DESCENDING), ('pricePerMile', ASCENDING)]),
+    ('scraping', 'flights', {}, [('timePulled', DESCENDING)]),
+    ('scraping', 'runSummaries', {}, [('timePulled', DESCENDING)]),
+    ('airports', 'airportCodes', {'code': {'$ne': ''}}, None),
+]
+
+
+@connect('MONGO')
+def ensure_indexes(client):
+    '''
+        Creates every declared index that does not exist yet
+
+    Returns:
+        List of index names that could not be created
+    '''
+
+    failed = []
+
+    for (db, collection), indexes in INDEXES.items():
+
+        try:
+            names = client[db][collection].create_indexes(indexes)
+            logging.info('Indexes on {db}.{collection}: {names}'.format(
+                db=db, collection=collection, names=', '.join(names)))
+        except OperationFailure as error:
+            logging.error(
+                'Could not create indexes on {db}.{collection}: {error}'
+                .format(db=db, collection=collection, error=error))
+            failed.extend(i.document['name'] for i in indexes)
+
+    return failed
+
+
+def _plan_stages(plan):
+
+    yield plan.get('stage')
+
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+
+@connect('MONGO')
+def check_query_plans(client):
+    '''
+        Explains the declared queries and reports the ones that scan
+        the whole collection or sort in memory
+
+    Returns:
+        List of (namespace, filter, problem stages) for slow plans
+    '''
+
+    slow = []
+
+    for db, collection, query, sort in QUERIES:
+
+        cursor = client[db][collection].find(query).limit(15)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        problems = sorted(
+            {i for i in _plan_stages(plan) if i in ('COLLSCAN', 'SORT')})
+
+        namespace = '{db}.{collection}'.format(db=db, collection=collection)
+
+        if problems:
+            logging.warning(
+                'Slow query plan on {namespace} {query}: {stages}'.format(
+                    namespace=namespace, query=query,
+                    stages=', '.join(problems)))
+            slow.append((namespace, query, problems))
+        else:
+            logging.info('Query on {namespace} {query} uses an index'.format(
+                namespace=namespace, query=query))
+
+    return slow
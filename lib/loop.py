@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+'''
+    Runs coroutines on uvloop when it is installed
+
+    The event loop policy is picked the first time a coroutine is
+    run instead of on import, so modules that never start a loop do
+    not pay for loading uvloop
+'''
+
+import asyncio
+
+from configs.config import Configs
+
+_policy_chosen = False
+
+
+def _choose_policy():
+
+    global _policy_chosen
+
+    if _policy_chosen:
+        return
+
+    _policy_chosen = True
+
+    if not Configs.use_uvloop:
+        return
+
+    try:
+        import uvloop
+    except ImportError:
+        return
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def run(coroutine):
+    '''
+        asyncio.run on uvloop, or the default loop without it
+
+    Args:
+        coroutine(coroutine): coroutine to run to completion
+
+    Returns:
+        What the coroutine returns
+    '''
+
+    _choose_policy()
+
+    return asyncio.run(coroutine)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+'''
+    Collects where a scrape run spends its time
+
+    Every stage of the fetch -> parse -> store path records its
+    latencies in a histogram, and the fetch engine, parser and
+    writer count requests, bytes, proxy outcomes, missing fields
+    and written documents. At the end of a run the numbers are
+    saved to scraping.runStats and can be written out in the
+    Prometheus text format for a node exporter textfile collector
+'''
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from configs.config import Configs
+from lib.decorator import connect
+
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0
+)
+
+
+class histogram(object):
+    '''
+        Counts of observations at or under each bucket bound
+    '''
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds=BUCKETS):
+
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        '''
+            (bound, observations <= bound) pairs, ending with +Inf
+        '''
+
+        total = 0
+        pairs = []
+
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+
+        pairs.append((float('inf'), self.count))
+
+        return pairs
+
+    def quantile(self, q):
+        '''
+            Upper bound of the bucket holding the q-th quantile
+        '''
+
+        if not self.count:
+            return None
+
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return min(bound, self.max)
+
+    def to_document(self):
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': [
+                {'le': bound, 'count': count}
+                for bound, count in self.cumulative()[:-1]
+            ]
+        }
+
+
+class runMetrics(object):
+    '''
+        Counters and stage histograms for one run of one process
+
+        Safe to update from the event loop, executor threads and the
+        writer's flush thread at the same time
+
+    Args:
+        run_id(str): run the numbers belong to
+        worker_id(str): process that collected them, for runs shared
+            between workers
+    '''
+
+    def __init__(self, run_id=None, worker_id=None):
+
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.started = datetime.utcnow()
+
+        self.stages = {}
+        self.requests = 0
+        self.failed_requests = 0
+        self.bytes = 0
+        self.proxies = {}
+        self.pages = 0
+        self.empty_pages = 0
+        self.parse_errors = 0
+        self.missing_fields = {}
+        self.documents = 0
+        self.cache_hits = 0
+
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        '''
+            Records how long one item spent in a stage
+        '''
+
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = histogram()
+            self.stages[stage].observe(seconds)
+
+    def record_request(self, proxy, seconds, size, ok):
+        '''
+            Records one request made through a proxy
+        '''
+
+        self.observe('fetch', seconds)
+
+        with self._lock:
+
+            self.requests += 1
+            self.bytes += size
+
+            outcome = self.proxies.setdefault(proxy, [0, 0])
+            outcome[0 if ok else 1] += 1
+
+            if not ok:
+                self.failed_requests += 1
+
+    def record_cache_hit(self):
+
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_page(self, listings, missing=()):
+        '''
+            Records a parsed page, its listing count and every field
+            a listing came back without
+        '''
+
+        with self._lock:
+
+            self.pages += 1
+
+            if not listings:
+                self.empty_pages += 1
+
+            for field in missing:
+                self.missing_fields[field] = (
+                    self.missing_fields.get(field, 0) + 1)
+
+    def record_parse_error(self):
+
+        with self._lock:
+            self.parse_errors += 1
+
+    def record_written(self, count):
+
+        with self._lock:
+            self.documents += count
+
+    def elapsed(self):
+
+        return time.monotonic() - self._start
+
+    def to_document(self):
+        '''
+            Snapshot of every number for scraping.runStats
+        '''
+
+        with self._lock:
+
+            elapsed = self.elapsed()
+
+            return {
+                '_id': ':'.join(
+                    str(i) for i in (self.run_id, self.worker_id) if i),
+                'run': self.run_id,
+                'worker': self.worker_id,
+                'started': self.started,
+                'updated': datetime.utcnow(),
+                'elapsed': elapsed,
+                'requests': {
+                    'total': self.requests,
+                    'failed': self.failed_requests,
+                    'perSecond': self.requests / elapsed if elapsed else None,
+                    'cacheHits': self.cache_hits
+                },
+                'bytes': self.bytes,
+                'stages': {
+                    name: stage.to_document()
+                    for name, stage in self.stages.items()
+                },
+                'proxies': sorted(
+                    (
+                        {
+                            'proxy': proxy,
+                            'ok': ok,
+                            'failed': failed,
+                            'successRatio': ok / (ok + failed)
+                        }
+                        for proxy, (ok, failed) in self.proxies.items()
+                    ),
+                    key=lambda i: -(i['ok'] + i['failed'])),
+                'parse': {
+                    'pages': self.pages,
+                    'emptyPages': self.empty_pages,
+                    'errors': self.parse_errors,
+                    'missingFields': [
+                        {'field': field, 'count': count}
+                        for field, count in sorted(
+                            self.missing_fields.items(),
+                            key=lambda i: -i[1])
+                    ]
+                },
+                'documents': self.documents
+            }
+
+    def to_prometheus(self):
+        '''
+            Every number in the Prometheus text exposition format
+        '''
+
+        labels = 'run="{run}"'.format(run=self.run_id or '')
+
+        if self.worker_id:
+            labels += ',worker="{worker}"'.format(worker=self.worker_id)
+
+        lines = []
+        declared = set()
+
+        def _metric(name, kind, value, extra='', family=None):
+            # A histogram's _bucket, _sum and _count series share the
+            # TYPE line of their family
+            family = family or name
+            if family not in declared:
+                declared.add(family)
+                lines.append('# TYPE {family} {kind}'.format(
+                    family=family, kind=kind))
+            lines.append('{name}{{{labels}{extra}}} {value}'.format(
+                name=name, labels=labels, extra=extra, value=value))
+
+        with self._lock:
+
+            _metric('airtime_requests_total', 'counter', self.requests)
+            _metric(
+                'airtime_requests_failed_total', 'counter',
+                self.failed_requests)
+            _metric('airtime_cache_hits_total', 'counter', self.cache_hits)
+            _metric('airtime_downloaded_bytes_total', 'counter', self.bytes)
+            _metric('airtime_pages_parsed_total', 'counter', self.pages)
+            _metric(
+                'airtime_pages_empty_total', 'counter', self.empty_pages)
+            _metric(
+                'airtime_parse_errors_total', 'counter', self.parse_errors)
+            _metric(
+                'airtime_documents_written_total', 'counter', self.documents)
+
+            for field, count in sorted(self.missing_fields.items()):
+                _metric(
+                    'airtime_missing_fields_total', 'counter', count,
+                    ',field="{field}"'.format(field=field))
+
+            for proxy, (ok, failed) in sorted(self.proxies.items()):
+                for outcome, count in (('ok', ok), ('failed', failed)):
+                    _metric(
+                        'airtime_proxy_requests_total', 'counter', count,
+                        ',proxy="{proxy}",outcome="{outcome}"'.format(
+                            proxy=proxy, outcome=outcome))
+
+            family = 'airtime_stage_seconds'
+
+            for name, stage in sorted(self.stages.items()):
+                extra = ',stage="{stage}"'.format(stage=name)
+                for bound, total in stage.cumulative():
+                    _metric(
+                        family + '_bucket', 'histogram', total,
+                        extra + ',le="{le}"'.format(
+                            le='+Inf' if bound == float('inf') else bound),
+                        family)
+                _metric(
+                    family + '_sum', 'histogram', stage.sum, extra, family)
+                _metric(
+                    family + '_count', 'histogram', stage.count, extra,
+                    family)
+
+        return '\n'.join(lines) + '\n'
+
+    def log_summary(self):
+
+        document = self.to_document()
+
+        logging.info(
+            'Run stats: {requests} requests ({failed} failed, '
+            '{rps:.1f}/s), {megabytes:.1f} MB, {pages} pages parsed, '
+            '{documents} documents written'.format(
+                requests=document['requests']['total'],
+                failed=document['requests']['failed'],
+                rps=document['requests']['perSecond'] or 0,
+                megabytes=document['bytes'] / 2 ** 20,
+                pages=document['parse']['pages'],
+                documents=document['documents']))
+
+        for name, stage in document['stages'].items():
+            logging.info(
+                'Stage {name}: {count} items, mean {mean:.3f}s, '
+                'p95 {p95:.3f}s, total {total:.1f}s'.format(
+                    name=name, count=stage['count'], mean=stage['mean'],
+                    p95=stage['p95'], total=stage['sum']))
+
+    @connect('MONGO')
+    def save(client, self):
+        '''
+            Stores the snapshot in scraping.runStats, and in the
+            Prometheus textfile when metrics_prometheus_path is set
+        '''
+
+        document = self.to_document()
+
+        client.scraping.runStats.replace_one(
+            {'_id': document['_id']}, document, upsert=True)
+
+        path = Configs.metrics_prometheus_path
+
+        if path:
+            partial_path = path + '.partial'
+            with open(partial_path, 'w') as prometheus_file:
+                prometheus_file.write(self.to_prometheus())
+            os.replace(partial_path, path)
+
+        return document
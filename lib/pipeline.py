@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+'''
+    Streams web pages through fetch -> parse -> store stages
+
+    The stages run at the same time and are joined by bounded queues,
+    so parsing starts with the first response and a slow stage holds
+    back the stages in front of it instead of letting memory grow
+'''
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+
+from configs.config import Configs
+from lib import loop
+from lib.fetcher import fetchEngine
+
+_DONE = object()
+
+
+async def _report_failure(on_failure, url):
+
+    if on_failure is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, on_failure, url)
+
+
+async def _fetch_stage(
+    engine, urls, parse_queue, parse_workers, on_failure
+):
+
+    async for url, page in engine.stream(urls):
+
+        if page is None:
+            logging.info('No response for {url}'.format(url=url))
+            await _report_failure(on_failure, url)
+            continue
+
+        await parse_queue.put((url, page))
+
+    for _ in range(parse_workers):
+        await parse_queue.put(_DONE)
+
+
+def _observe(metrics, stage, start_time):
+
+    if metrics is not None:
+        metrics.observe(stage, time.monotonic() - start_time)
+
+
+async def _parse_stage(
+    engine, parse, build, executor, parse_queue, store_queue, on_failure,
+    metrics
+):
+
+    loop = asyncio.get_running_loop()
+
+    while True:
+
+        item = await parse_queue.get()
+
+        if item is _DONE:
+            return
+
+        url, page = item
+
+        try:
+            start_time = time.monotonic()
+            parsed = await loop.run_in_executor(
+                executor, parse, url, page.body)
+            _observe(metrics, 'parse', start_time)
+
+            start_time = time.monotonic()
+            documents = build(url, parsed) if build else parsed
+            if build:
+                _observe(metrics, 'build', start_time)
+        except Exception:
+            logging.exception('Failed to parse {url}'.format(url=url))
+            if metrics is not None:
+                metrics.record_parse_error()
+            documents = None
+
+        # Only pages that gave documents are cached, a captcha or no
+        # results page would otherwise be served again until it expires
+        if documents:
+            await engine.cache_page(page)
+            await store_queue.put(documents)
+        else:
+            await engine.uncache_page(page)
+            await _report_failure(on_failure, url)
+
+
+async def _store_stage(store, executor, store_queue, metrics):
+
+    loop = asyncio.get_running_loop()
+
+    while True:
+
+        documents = await store_queue.get()
+
+        if documents is _DONE:
+            return
+
+        start_time = time.monotonic()
+        await loop.run_in_executor(executor, store, documents)
+        _observe(metrics, 'store', start_time)
+
+
+async def stream_pipeline(
+    urls, proxies, parse, store, build=None, queue_size=None,
+    parse_workers=None, parse_executor=None, on_failure=None, metrics=None,
+    **engine_options
+):
+    '''
+        Runs the fetch, parse and store stages until every url
+        has been handled
+
+    Args:
+        urls(iterable): urls to load, may be a lazy or async iterator
+        proxies(list): proxies to load the urls through
+        parse(callable): parse(url, body) run on parse_executor with
+            the raw response bytes, must be picklable when the
+            executor is a process pool
+        store(callable): store(documents) writes parsed documents
+        build(callable): build(url, parsed) -> list of documents, runs
+            on the event loop, parse must return documents if not given
+        queue_size(int): max items waiting between two stages
+        parse_workers(int): number of pages parsed at the same time
+        parse_executor(Executor): where parse runs, a thread pool
+            sized to parse_workers if not given
+        on_failure(callable): on_failure(url) for every url that could
+            not be loaded or gave no documents
+        metrics(runMetrics): records how long each page spends in
+            every stage, and is handed to the fetch engine
+        engine_options: passed on to fetchEngine, e.g. cache, a page
+            is only cached once it has given documents
+    '''
+
+    queue_size = queue_size or Configs.pipeline_queue_size
+    parse_workers = parse_workers or Configs.pipeline_parse_workers
+
+    parse_queue = asyncio.Queue(maxsize=queue_size)
+    store_queue = asyncio.Queue(maxsize=queue_size)
+
+    own_executor = parse_executor is None
+    if own_executor:
+        parse_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=parse_workers)
+    store_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def _parse_all(engine):
+
+        await asyncio.gather(*[
+            _parse_stage(
+                engine, parse, build, parse_executor, parse_queue,
+                store_queue, on_failure, metrics)
+            for _ in range(parse_workers)
+        ])
+        await store_queue.put(_DONE)
+
+    try:
+        async with fetchEngine(
+            proxies, metrics=metrics, cache_on_fetch=False, **engine_options
+        ) as engine:
+
+            stages = [
+                asyncio.ensure_future(_fetch_stage(
+                    engine, urls, parse_queue, parse_workers, on_failure)),
+                asyncio.ensure_future(_parse_all(engine)),
+                asyncio.ensure_future(_store_stage(
+                    store, store_executor, store_queue, metrics))
+            ]
+
+            try:
+                done, _ = await asyncio.wait(
+                    stages, return_when=asyncio.FIRST_EXCEPTION)
+                for stage in done:
+                    stage.result()
+            finally:
+                for stage in stages:
+                    stage.cancel()
+    finally:
+        store_executor.shutdown(wait=True)
+        if own_executor:
+            parse_executor.shutdown(wait=True)
+
+
+def run_pipeline(urls, proxies, parse, store, **kwargs):
+    '''
+        Blocking entry point for stream_pipeline
+    '''
+
+    return loop.run(stream_pipeline(urls, proxies, parse, store, **kwargs))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+'''
+    cProfile helpers for finding where a slow run spends its time
+
+    A profiled script saves its profile next to earlier ones and
+    prints the functions with the most cumulative time, then the
+    hottest HTML parsing and mongo functions so regressions in
+    either show up on their own
+
+    Parser workers run on executor threads or processes that the
+    main profile does not see, so they can be profiled separately
+    with profiledParser and merged into one profile afterwards
+'''
+
+import cProfile
+import glob
+import os
+import pstats
+import sys
+import threading
+from datetime import datetime
+
+from configs.config import Configs
+
+# Regexes matched against 'path:line(function)' of every profiled
+# function, each group is printed as its own section
+PROFILE_GROUPS = (
+    ('HTML parsing', r'bs4|lxml|selectolax|[/\\]extractors\.py'),
+    ('mongo', r'pymongo|bson|[/\\]lib[/\\](writer|runs)\.py'),
+)
+
+_worker_profiles = {}
+_worker_lock = threading.Lock()
+
+
+def profile_name(prefix):
+    '''
+        Name for a new profile, prefix followed by the current time
+    '''
+
+    return '{prefix}-{time}'.format(
+        prefix=prefix, time=datetime.now().strftime('%Y%m%dT%H%M%S'))
+
+
+def profile_path(directory, name):
+
+    directory = directory or Configs.profile_dir
+    os.makedirs(directory, exist_ok=True)
+
+    return os.path.join(directory, name + '.prof')
+
+
+def report(stats, limit=None, stream=None):
+    '''
+        Prints the hottest functions of a profile
+
+    Args:
+        stats(pstats.Stats or str): profile, or the path it was saved to
+        limit(int): functions printed in the overall list, each group
+            gets a third of it
+        stream(file): where to print, stdout if not given
+    '''
+
+    limit = limit or Configs.profile_top
+    stream = stream or sys.stdout
+
+    if not isinstance(stats, pstats.Stats):
+        stats = pstats.Stats(stats, stream=stream)
+
+    stats.stream = stream
+
+    print('Hottest functions by cumulative time:', file=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+
+    for group, pattern in PROFILE_GROUPS:
+        print('Hottest {group} functions by own time:'.format(
+            group=group), file=stream)
+        stats.sort_stats('tottime').print_stats(pattern, max(limit // 3, 1))
+
+
+def profile_call(function, *args, directory=None, name=None, **kwargs):
+    '''
+        Runs function under cProfile, saves the profile and prints
+        its hottest functions, even if function raises
+
+    Args:
+        function(callable): function to profile
+        directory(str): where the profile is saved, defaults to
+            Configs.profile_dir
+        name(str): file name of the profile without extension
+
+    Returns:
+        What function returns
+    '''
+
+    profile = cProfile.Profile()
+    path = profile_path(directory, name or profile_name('main'))
+
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
+        print('Saved profile to {path}'.format(path=path))
+        report(path)
+
+
+class profiledParser(object):
+    '''
+        Wraps a parse function so every call on a parser worker is
+        profiled, one profile per worker thread
+
+        Picklable so it can be handed to a process pool, worker
+        processes save their profiles to directory when they exit.
+        Profiles of threads in this process are saved by
+        save_worker_profiles
+
+    Args:
+        function(callable): parse function to profile
+        directory(str): where worker profiles are saved
+        name(str): prefix of the worker profile files
+    '''
+
+    def __init__(self, function, directory, name):
+
+        self.function = function
+        self.directory = directory
+        self.name = name
+        self.parent = os.getpid()
+
+    def __call__(self, *args, **kwargs):
+
+        profile = _worker_profile(self)
+
+        try:
+            return profile.runcall(self.function, *args, **kwargs)
+        except ValueError:
+            # Another profiler already covers this thread
+            return self.function(*args, **kwargs)
+
+
+def _worker_profile(parser):
+
+    key = threading.get_ident()
+    profile = _worker_profiles.get(key)
+
+    if profile is not None:
+        return profile
+
+    with _worker_lock:
+
+        if not _worker_profiles and os.getpid() != parser.parent:
+
+            from multiprocessing.util import Finalize
+
+            # Pool workers exit through multiprocessing, which runs
+            # its finalizers but not atexit handlers
+            Finalize(
+                None, save_worker_profiles,
+                args=(parser.directory, parser.name), exitpriority=10)
+
+        profile = _worker_profiles[key] = cProfile.Profile()
+
+    return profile
+
+
+class _snapshot(object):
+    '''
+        Stats of a profile another thread ran, pstats calls
+        create_stats on what it loads and that would disable the
+        profiler of the calling thread instead
+    '''
+
+    def __init__(self, profile):
+
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+
+        pass
+
+
+def save_worker_profiles(directory, name):
+    '''
+        Merges the parser profiles of every thread in this process
+        into one file
+
+    Returns:
+        Path of the saved profile, None if nothing was profiled
+    '''
+
+    with _worker_lock:
+        profiles = list(_worker_profiles.values())
+        _worker_profiles.clear()
+
+    if not profiles:
+        return None
+
+    stats = pstats.Stats(*[_snapshot(i) for i in profiles])
+
+    path = profile_path(directory, '{name}.{pid}'.format(
+        name=name, pid=os.getpid()))
+    stats.dump_stats(path)
+
+    return path
+
+
+def merge_profiles(directory, name):
+    '''
+        Merges every worker profile saved under name into
+        <name>.prof and removes the per worker files
+
+    Returns:
+        Path of the merged profile, None if there were none
+    '''
+
+    directory = directory or Configs.profile_dir
+    paths = sorted(glob.glob(os.path.join(
+        directory, '{name}.*.prof'.format(name=name))))
+
+    if not paths:
+        return None
+
+    stats = pstats.Stats(*paths)
+    path = profile_path(directory, name)
+    stats.dump_stats(path)
+
+    for i in paths:
+        os.remove(i)
+
+    return path
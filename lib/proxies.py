@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+'''
+    Tracks how well each proxy performs and picks proxies by score
+
+    Every proxy keeps an exponentially decayed latency and success
+    rate. Proxies are chosen with probability proportional to
+    success / latency, and a failing proxy is quarantined for a
+    backoff that doubles with each consecutive failure
+'''
+
+import errno
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+
+from configs.config import Configs
+from lib.decorator import connect
+
+# Errors raised by this machine running out of sockets or file
+# descriptors, they say nothing about the proxy being probed
+LOCAL_ERRNOS = frozenset(
+    getattr(errno, i) for i in (
+        'EMFILE', 'ENFILE', 'ENOBUFS', 'ENOMEM', 'EADDRNOTAVAIL'
+    ) if hasattr(errno, i)
+)
+
+
+def proxy_url(proxy):
+    '''
+        Proxies from sslproxies are stored as https://ip:port but they
+        are plain HTTP proxies that tunnel TLS with CONNECT
+
+    Args:
+        proxy(str): proxy as stored in mongo
+
+    Returns:
+        Proxy url usable by aiohttp
+    '''
+
+    if proxy and proxy.startswith('https://'):
+        return 'http://' + proxy[len('https://'):]
+    return proxy
+
+
+class proxyStats(object):
+    '''
+        Running score of a single proxy
+    '''
+
+    __slots__ = (
+        'proxy', 'latency', 'success', 'last_failure', 'failures',
+        'quarantined_until'
+    )
+
+    def __init__(
+        self, proxy, latency=None, success=None, last_failure=None,
+        failures=0, quarantined_until=0.0
+    ):
+
+        self.proxy = proxy
+        self.latency = latency or Configs.proxy_prior_latency
+        self.success = (
+            Configs.proxy_prior_success if success is None else success)
+        self.last_failure = last_failure
+        self.failures = failures
+        self.quarantined_until = quarantined_until
+
+    @property
+    def weight(self):
+
+        return max(self.success, 0.01) / max(self.latency, 0.05)
+
+    def to_document(self):
+
+        return {
+            '_id': self.proxy,
+            'latency': self.latency,
+            'success': self.success,
+            'lastFailure': (
+                datetime.utcfromtimestamp(self.last_failure)
+                if self.last_failure else None),
+            'failures': self.failures,
+            'quarantinedUntil': datetime.utcfromtimestamp(
+                self.quarantined_until),
+            'updated': datetime.utcnow()
+        }
+
+    @classmethod
+    def from_document(cls, document):
+
+        def _timestamp(value):
+            if value:
+                return (value - datetime(1970, 1, 1)).total_seconds()
+            return None
+
+        return cls(
+            proxy=document['_id'],
+            latency=document.get('latency'),
+            success=document.get('success'),
+            last_failure=_timestamp(document.get('lastFailure')),
+            failures=document.get('failures', 0),
+            quarantined_until=_timestamp(
+                document.get('quarantinedUntil')) or 0.0
+        )
+
+
+class proxyPool(object):
+    '''
+        Weighted proxy selection with health tracking
+
+    Args:
+        proxies(list): proxy urls, or proxyStats to start from
+        decay(float): weight given to the newest observation
+    '''
+
+    def __init__(self, proxies=(), decay=None):
+
+        self.decay = decay or Configs.proxy_score_decay
+        self.stats = {}
+        self._lock = threading.Lock()
+
+        self.add(proxies)
+
+    def __len__(self):
+
+        return len(self.stats)
+
+    def __iter__(self):
+
+        return iter(list(self.stats))
+
+    def add(self, proxies):
+        '''
+            Adds proxies to the pool, keeping the scores of
+            proxies it already tracks
+        '''
+
+        with self._lock:
+            for proxy in proxies:
+                if isinstance(proxy, proxyStats):
+                    self.stats.setdefault(proxy.proxy, proxy)
+                else:
+                    self.stats.setdefault(proxy, proxyStats(proxy))
+
+    def remove(self, proxy):
+
+        with self._lock:
+            self.stats.pop(proxy, None)
+
+    def sync(self, proxies):
+        '''
+            Makes the pool track exactly the given proxies, keeping the
+            scores of the ones it already has. An empty list is ignored
+            so a pool never drains while the saved list is rebuilt
+        '''
+
+        proxies = list(proxies)
+
+        if not proxies:
+            return
+
+        keep = {
+            i.proxy if isinstance(i, proxyStats) else i for i in proxies}
+
+        # Adding first means a request choosing a proxy meanwhile
+        # never finds the pool empty
+        self.add(proxies)
+
+        with self._lock:
+            for proxy in list(self.stats):
+                if proxy not in keep:
+                    del self.stats[proxy]
+
+    def reload(self):
+        '''
+            Picks up proxies added to or removed from the saved
+            proxy list since the pool was loaded
+        '''
+
+        proxies = load_saved_proxies()
+        new = [i for i in proxies if i not in self.stats]
+        saved = load_saved_scores(new) if new else {}
+
+        self.sync([saved.get(i, i) for i in proxies])
+
+        if new:
+            logging.info('Picked up {number} new proxies'.format(
+                number=len(new)))
+
+    def start_reloading(self, interval=None):
+        '''
+            Reloads the saved proxy list on a background thread so a
+            long run uses proxies refreshed while it is running
+        '''
+
+        interval = interval or Configs.proxy_reload_interval
+        self._stop_reloading = threading.Event()
+
+        def _reload():
+            while not self._stop_reloading.wait(interval):
+                try:
+                    self.reload()
+                except Exception:
+                    logging.exception('Could not reload proxy list')
+
+        threading.Thread(
+            target=_reload, name='proxyPool', daemon=True).start()
+
+    def stop_reloading(self):
+
+        stop = getattr(self, '_stop_reloading', None)
+
+        if stop is not None:
+            stop.set()
+
+    def choose(self, exclude=()):
+        '''
+            Picks a proxy weighted by its score
+
+        Args:
+            exclude(collection): proxies to avoid, ignored when they
+                are every proxy left, e.g. after a reload shrank the
+                pool
+
+        Returns:
+            Proxy url, the proxy closest to leaving quarantine if
+            every candidate is quarantined
+        '''
+
+        now = time.time()
+
+        with self._lock:
+
+            candidates = [
+                i for i in self.stats.values() if i.proxy not in exclude]
+
+            if not candidates:
+                candidates = list(self.stats.values())
+
+            if not candidates:
+                raise Exception(
+                    'Not able to load webpage, the proxy list is empty.')
+
+            healthy = [i for i in candidates if i.quarantined_until <= now]
+
+            if not healthy:
+                return min(
+                    candidates, key=lambda i: i.quarantined_until).proxy
+
+            return random.choices(
+                healthy, weights=[i.weight for i in healthy])[0].proxy
+
+    def record_success(self, proxy, latency):
+        '''
+            Scores a request that came back through the proxy
+        '''
+
+        with self._lock:
+
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+
+            stats.latency += self.decay * (latency - stats.latency)
+            stats.success += self.decay * (1.0 - stats.success)
+            stats.failures = 0
+            stats.quarantined_until = 0.0
+
+    def record_failure(self, proxy, latency=None):
+        '''
+            Scores a failed request and quarantines the proxy
+        '''
+
+        now = time.time()
+
+        with self._lock:
+
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+
+            if latency is not None:
+                stats.latency += self.decay * (latency - stats.latency)
+
+            stats.success -= self.decay * stats.success
+
+            # Requests already in flight when the proxy was quarantined
+            # should not stretch its backoff any further
+            if stats.quarantined_until > now:
+                return
+
+            stats.failures += 1
+            stats.last_failure = now
+            stats.quarantined_until = now + min(
+                Configs.proxy_quarantine * 2 ** (stats.failures - 1),
+                Configs.proxy_max_quarantine)
+
+        logging.info(
+            'Quarantined proxy {proxy} after {failures} failures'
+            .format(proxy=proxy, failures=stats.failures))
+
+
+@connect('MONGO')
+def load_saved_proxies(client):
+    '''
+        Pulls the saved proxy list from mongo
+    '''
+
+    document = client.scraping.proxyIps.find_one({'_id': 'proxyIps'})
+
+    return (document or {}).get('ipList', [])
+
+
+@connect('MONGO')
+def load_saved_scores(client, proxies):
+    '''
+        Pulls the scores saved by earlier runs for the given proxies
+
+    Returns:
+        Dictionary {proxy: proxyStats}
+    '''
+
+    return {
+        i['_id']: proxyStats.from_document(i)
+        for i in client.scraping.proxyStats.find({'_id': {'$in': proxies}})
+    }
+
+
+def load_proxy_pool(proxies=None):
+    '''
+        Builds a proxy pool with the scores saved by earlier runs
+
+    Args:
+        proxies(list): proxies to use, the saved proxy list if not given
+
+    Returns:
+        proxyPool
+    '''
+
+    if proxies is None:
+        proxies = load_saved_proxies()
+
+    saved = load_saved_scores(proxies)
+
+    logging.info('Loaded {number} proxies, {scored} with saved scores'.format(
+        number=len(proxies), scored=len(saved)))
+
+    return proxyPool([saved.get(i, i) for i in proxies])
+
+
+def harvest_proxies():
+    '''
+        Retrives elite proxy ips from sslproxies.org to be tested
+        for usability
+
+    Returns:
+        List of proxy urls
+    '''
+
+    import requests
+    from bs4 import BeautifulSoup
+
+    logging.info('Getting proxy IPs from https://sslproxies.org')
+
+    reponse = requests.get(
+        'https://www.sslproxies.org/', timeout=60).text
+
+    soup = BeautifulSoup(reponse, 'html.parser')
+    proxies_table = soup.find(id='proxylisttable')
+
+    proxies = []
+
+    for row in proxies_table.tbody.find_all('tr'):
+
+        scraped_data = row.find_all('td')
+
+        if scraped_data[4].string.lower() == 'elite proxy':
+
+            url = (
+                "https://" +
+                scraped_data[0].string + ':' +
+                scraped_data[1].string
+            )
+
+            proxies.append(url)
+
+    return proxies
+
+
+@connect('MONGO')
+def save_proxy_pool(client, pool):
+    '''
+        Persists the scores of every proxy in the pool
+    '''
+
+    from pymongo import UpdateOne
+
+    # $set keeps the fields record_validation saves on the same
+    # documents, e.g. the count of failed probes in a row
+    requests = [
+        UpdateOne({'_id': i.proxy}, {'$set': i.to_document()}, upsert=True)
+        for i in list(pool.stats.values())
+    ]
+
+    if requests:
+        client.scraping.proxyStats.bulk_write(requests, ordered=False)
+
+    logging.info('Saved scores for {number} proxies'.format(
+        number=len(requests)))
+
+
+def is_local_error(error):
+    '''
+        Whether an error came from this machine running out of
+        sockets or file descriptors rather than from the proxy
+    '''
+
+    while error is not None:
+
+        if getattr(error, 'errno', None) in LOCAL_ERRNOS:
+            return True
+
+        # aiohttp keeps the socket error on connector errors
+        os_error = getattr(error, 'os_error', None)
+        if getattr(os_error, 'errno', None) in LOCAL_ERRNOS:
+            return True
+
+        error = error.__cause__ or error.__context__
+
+    return False
+
+
+def probe_concurrency(concurrency=None):
+    '''
+        Probes allowed in flight, kept below the file descriptor limit
+        so probes do not fail for lack of sockets
+    '''
+
+    concurrency = concurrency or Configs.proxy_probe_concurrency
+
+    try:
+        import resource
+    except ImportError:
+        return concurrency
+
+    limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if limit == resource.RLIM_INFINITY:
+        return concurrency
+
+    return max(1, min(
+        concurrency, limit - Configs.proxy_probe_reserved_fds, limit // 2))
+
+
+async def probe_proxy(session, proxy):
+    '''
+        Sends one lightweight request through a proxy
+
+    Returns:
+        (proxy, good, latency in seconds), good is None when the probe
+        failed because of this machine and the proxy is unknown
+    '''
+
+    import asyncio
+
+    import aiohttp
+
+    start_time = time.monotonic()
+
+    try:
+        async with session.head(
+            Configs.proxy_probe_url, proxy=proxy_url(proxy),
+            allow_redirects=False
+        ) as response:
+            good = response.status < 400
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+        good = None if is_local_error(error) else False
+
+    return proxy, good, time.monotonic() - start_time
+
+
+async def validate_proxies(proxies, on_result, concurrency=None):
+    '''
+        Probes every proxy concurrently and hands each result to
+        on_result as soon as it is known
+
+    Args:
+        proxies(list): proxy urls to test
+        on_result(callable): on_result(proxy, good, latency), blocking
+            calls are run on a worker thread, good is None when the
+            proxy could not be checked
+        concurrency(int): max probes in flight, capped below the
+            file descriptor limit
+
+    Returns:
+        List of the proxies that passed
+    '''
+
+    import asyncio
+
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    concurrency = probe_concurrency(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    good_proxies = []
+    unknown = 0
+
+    timeout = aiohttp.ClientTimeout(
+        total=Configs.proxy_probe_timeout,
+        sock_connect=Configs.proxy_probe_connect_timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True)
+
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout
+    ) as session:
+
+        async def _probe(proxy):
+            async with semaphore:
+                result = await probe_proxy(session, proxy)
+            await loop.run_in_executor(None, on_result, *result)
+            return result
+
+        for probe in asyncio.as_completed([_probe(i) for i in proxies]):
+
+            proxy, good, latency = await probe
+
+            if good:
+                good_proxies.append(proxy)
+            elif good is None:
+                unknown += 1
+
+    if unknown:
+        logging.warning(
+            'Could not check {unknown} proxies, out of sockets or file '
+            'descriptors at {concurrency} probes'.format(
+                unknown=unknown, concurrency=concurrency))
+
+    return good_proxies
+
+
+@connect('MONGO')
+def record_validation(client, proxy, good, latency):
+    '''
+        Saves one proxy check, adding a good proxy to the saved proxy
+        list and removing a proxy once proxy_probe_max_failures
+        probes in a row have failed
+
+        A check that could not be made, good is None, changes nothing
+    '''
+
+    from pymongo import ReturnDocument
+
+    if good is None:
+        logging.info('PROXY: {proxy} NOT CHECKED ({latency:.2f}s)'.format(
+            proxy=proxy, latency=latency))
+        return
+
+    now = datetime.utcnow()
+
+    if good:
+        client.scraping.proxyStats.update_one(
+            {'_id': proxy},
+            {'$set': {
+                'latency': latency,
+                'alive': True,
+                'lastValidated': now,
+                'failures': 0,
+                'probeFailures': 0,
+                'quarantinedUntil': datetime.utcfromtimestamp(0)
+            }},
+            upsert=True)
+        client.scraping.proxyIps.update_one(
+            {'_id': 'proxyIps'}, {'$addToSet': {'ipList': proxy}},
+            upsert=True)
+        state = 'GOOD CONNECTION, PROXY SAVED'
+    else:
+        stats = client.scraping.proxyStats.find_one_and_update(
+            {'_id': proxy},
+            {
+                '$set': {
+                    'latency': latency,
+                    'alive': False,
+                    'lastValidated': now,
+                    'lastFailure': now
+                },
+                '$inc': {'probeFailures': 1}
+            },
+            upsert=True, return_document=ReturnDocument.AFTER)
+        failures = stats.get('probeFailures', 1)
+
+        if failures >= Configs.proxy_probe_max_failures:
+            client.scraping.proxyIps.update_one(
+                {'_id': 'proxyIps'}, {'$pull': {'ipList': proxy}},
+                upsert=True)
+            state = 'BAD CONNECTION, PROXY REMOVED'
+        else:
+            state = 'BAD CONNECTION {failures} IN A ROW'.format(
+                failures=failures)
+
+    logging.info('PROXY: {proxy} {state} ({latency:.2f}s)'.format(
+        proxy=proxy, state=state, latency=latency))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+'''
+    Caps how fast requests are sent to each target site
+
+    Every host gets a token bucket that refills at a steady rate and
+    holds up to a burst of tokens. A request takes one token, waiting
+    on the event loop until one is free, so a run never sends a site
+    more than rate requests a second on average however many
+    requests it has in flight
+
+    Workers sharing a run each split the rate between the live
+    workers of the run, see workQueue.heartbeat
+'''
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from configs.config import Configs
+
+
+class tokenBucket(object):
+    '''
+        Steady request rate with room for short bursts
+
+    Args:
+        rate(float): tokens added per second
+        burst(int): most tokens held at once
+    '''
+
+    def __init__(self, rate, burst=None):
+
+        self.rate = rate
+        self.burst = max(burst or 1, 1)
+        self.waited = 0.0
+
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        '''
+            Waits until a token is free and takes it
+        '''
+
+        async with self._lock:
+
+            while True:
+
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+
+class rateLimiter(object):
+    '''
+        One token bucket per host
+
+        The rate and burst are for every process loading the same
+        sites together, share splits them evenly between workers
+
+    Args:
+        rate(float): requests per second allowed per host, no limit if 0
+        burst(int): requests a host may get at once after a quiet spell
+    '''
+
+    def __init__(self, rate=None, burst=None):
+
+        self.limit = Configs.fetch_rate_limit if rate is None else rate
+        self.limit_burst = burst or Configs.fetch_rate_burst
+        self.workers = 1
+        self.rate = self.limit
+        self.burst = self.limit_burst
+        self._buckets = {}
+
+    def share(self, workers):
+        '''
+            Limits this process to its part of the rate and burst when
+            workers processes load the same sites
+
+            Safe to call from another thread than the event loop's
+
+        Args:
+            workers(int): live processes sharing the limit, this one
+                included
+        '''
+
+        self.workers = max(workers, 1)
+        self.rate = self.limit / self.workers
+        self.burst = max(self.limit_burst // self.workers, 1)
+
+        for bucket in list(self._buckets.values()):
+            bucket.rate = self.rate
+            bucket.burst = self.burst
+
+    async def acquire(self, url):
+        '''
+            Waits for the url's host to have room for another request
+        '''
+
+        if not self.rate:
+            return
+
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+
+        if bucket is None:
+            bucket = tokenBucket(self.rate, self.burst)
+            self._buckets[host] = bucket
+
+        await bucket.acquire()
+
+    def waited(self):
+        '''
+            Total seconds requests spent waiting for a token
+        '''
+
+        return sum(i.waited for i in self._buckets.values())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+'''
+    Decides when and whether a failed request is tried again
+
+    One scheduler covers a whole run: every url gets the same attempt
+    budget, waits between attempts use exponential backoff with full
+    jitter, and once the run's deadline has passed neither a retry
+    nor a new url is started
+'''
+
+import random
+import time
+
+from configs.config import Configs
+
+
+class retryScheduler(object):
+    '''
+        Retry budget shared by every request of a run
+
+    Args:
+        max_attempts(int): attempts allowed per url, including the first
+        base_delay(float): seconds to wait before the first retry
+        max_delay(float): longest wait between two attempts
+        deadline(float): seconds from now after which no url is
+            started or retried, no deadline if 0
+    '''
+
+    def __init__(
+        self, max_attempts=None, base_delay=None, max_delay=None,
+        deadline=None
+    ):
+
+        self.max_attempts = max_attempts or Configs.retry_attempts
+        self.base_delay = base_delay or Configs.retry_base_delay
+        self.max_delay = max_delay or Configs.retry_max_delay
+
+        deadline = Configs.retry_deadline if deadline is None else deadline
+        self.deadline = time.monotonic() + deadline if deadline else None
+
+        self.retried = 0
+
+    def remaining(self):
+        '''
+            Seconds left before the deadline, None without a deadline
+        '''
+
+        if self.deadline is None:
+            return None
+
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def expired(self):
+
+        return self.deadline is not None and not self.remaining()
+
+    def should_retry(self, attempt):
+        '''
+            Whether a url that just failed its attempt-th try gets another
+
+        Args:
+            attempt(int): attempts made so far, starting at 1
+        '''
+
+        return attempt < self.max_attempts and not self.expired()
+
+    def delay(self, attempt):
+        '''
+            Jittered seconds to wait before the next attempt
+
+        Args:
+            attempt(int): attempts made so far, starting at 1
+        '''
+
+        self.retried += 1
+
+        delay = random.uniform(0, min(
+            self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+        remaining = self.remaining()
+
+        if remaining is not None:
+            delay = min(delay, remaining)
+
+        return delay
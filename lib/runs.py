@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+'''
+    Checkpoints scrape runs so an interrupted run can pick up
+    where it stopped
+
+    A run is stored in scraping.runs with the parameters it was
+    started with, and every url it has to load is stored in
+    scraping.runUrls as pending. A url is marked done once its
+    documents have been written to mongo and failed when it could
+    not be loaded or parsed, so resuming only loads the urls that
+    are not done yet
+'''
+
+import logging
+import uuid
+from datetime import datetime
+
+from lib.decorator import connect
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# Urls per delete, keeps each query well under the document size limit
+DISCARD_BATCH = 10000
+
+
+def run_id_for(run_time):
+    '''
+        Unique id of a run started at run_time, the start time
+        followed by a random suffix so runs started in the same
+        second stay apart and ids still sort by time
+    '''
+
+    return '{time}-{suffix}'.format(
+        time=run_time.strftime('%Y%m%dT%H%M%S'),
+        suffix=uuid.uuid4().hex[:12])
+
+
+@connect('MONGO')
+def start_run(client, run_id, run_time, params, urls, resave=False):
+    '''
+        Saves a new run and its urls as pending
+
+    Args:
+        run_id(str): id of the run
+        run_time(datetime): timePulled of the run's documents
+        params(dict): arguments needed to rebuild the run
+        urls(dict): {url: route job}
+        resave(bool): the run is being saved again on purpose, its
+            document is replaced and urls it already has are kept.
+            Otherwise an existing run with the same id raises
+    '''
+
+    from pymongo.errors import BulkWriteError
+
+    run = {
+        '_id': run_id,
+        'runTime': run_time,
+        'status': 'running',
+        'params': params,
+        'total': len(urls),
+        'started': datetime.utcnow(),
+        'updated': datetime.utcnow()
+    }
+
+    if resave:
+        client.scraping.runs.replace_one({'_id': run_id}, run, upsert=True)
+    else:
+        client.scraping.runs.insert_one(run)
+
+    if urls:
+        try:
+            client.scraping.runUrls.insert_many((
+                dict(job, run=run_id, url=url, status=PENDING)
+                for url, job in urls.items()
+            ), ordered=False)
+        except BulkWriteError:
+            if not resave:
+                raise
+            logging.info('Run {run_id} already has saved urls'.format(
+                run_id=run_id))
+
+    logging.info('Started run {run_id} with {number} urls'.format(
+        run_id=run_id, number=len(urls)))
+
+
+@connect('MONGO')
+def load_run(client, run_id=None):
+    '''
+        Pulls a saved run, the latest unfinished one if run_id is
+        not given
+
+    Returns:
+        The run document
+    '''
+
+    if run_id:
+        run = client.scraping.runs.find_one({'_id': run_id})
+    else:
+        run = client.scraping.runs.find_one(
+            {'status': {'$ne': 'complete'}}, sort=[('runTime', -1)])
+
+    if run is None:
+        raise Exception('No run to resume: ' + str(run_id or 'latest'))
+
+    return run
+
+
+@connect('MONGO')
+def unfinished_urls(client, run_id):
+    '''
+        Urls of a run that are still pending or failed last time
+
+    Returns:
+        Dictionary {url: route job} in priority order
+    '''
+
+    cursor = client.scraping.runUrls.find(
+        {'run': run_id, 'status': {'$ne': DONE}},
+        {'_id': False, 'run': False, 'status': False}
+    ).sort('priority', 1)
+
+    return {i.pop('url'): i for i in cursor}
+
+
+@connect('MONGO')
+def discard_partial_documents(client, run_time, urls):
+    '''
+        Removes documents an interrupted run wrote for urls that were
+        never marked done, so loading them again does not duplicate
+        flights
+    '''
+
+    urls = list(urls)
+    removed = 0
+
+    for i in range(0, len(urls), DISCARD_BATCH):
+        removed += client.scraping.flights.delete_many({
+            'timePulled': run_time,
+            'link': {'$in': urls[i:i + DISCARD_BATCH]}
+        }).deleted_count
+
+    if removed:
+        logging.info('Removed {number} partially saved flights'.format(
+            number=removed))
+
+    return removed
+
+
+@connect('MONGO')
+def finish_run(client, run_id):
+    '''
+        Marks a run complete when every url is done
+
+    Returns:
+        Number of urls that are not done
+    '''
+
+    left = client.scraping.runUrls.count_documents(
+        {'run': run_id, 'status': {'$ne': DONE}})
+
+    client.scraping.runs.update_one({'_id': run_id}, {'$set': {
+        'status': 'incomplete' if left else 'complete',
+        'updated': datetime.utcnow()
+    }})
+
+    logging.info('Run {run_id} finished with {left} urls not done'.format(
+        run_id=run_id, left=left))
+
+    return left
+
+
+class runCheckpoint(object):
+    '''
+        Records the progress of a run's urls as the pipeline
+        works through them
+
+    Args:
+        run_id(str): id of the run
+    '''
+
+    def __init__(self, run_id):
+
+        self.run_id = run_id
+        self.done = 0
+        self.failed = 0
+
+    def record_written(self, docs):
+        '''
+            Marks the urls of written documents done, meant to be the
+            mongoWriter on_flush callback
+        '''
+
+        urls = list({i['link'] for i in docs if i.get('link')})
+
+        if urls:
+            self.done += self._set_status(urls, DONE)
+
+    def record_failure(self, url):
+        '''
+            Marks a url that could not be loaded or parsed failed
+        '''
+
+        self.failed += self._set_status([url], FAILED)
+
+    @connect('MONGO')
+    def _set_status(client, self, urls, status):
+
+        return client.scraping.runUrls.update_many(
+            {'run': self.run_id, 'url': {'$in': urls}},
+            {'$set': {'status': status}}).modified_count
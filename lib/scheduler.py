@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+'''
+    Expands the searches to run into prioritized route jobs
+
+    A search matrix is every combination of origin, destination,
+    date window and passenger mix. Each combination is one job, the
+    search a single results page answers, and jobs come out in
+    priority order so the most wanted routes are loaded first
+'''
+
+import itertools
+from datetime import datetime, timedelta
+
+DATE_FORMAT = '%m/%d/%Y'
+
+
+def date_windows(
+    departure_date, return_date, last_departure_date=None, step_days=1
+):
+    '''
+        Slides a trip across a range of departure dates keeping
+        its length
+
+    Args:
+        departure_date(str): first departure date, MM/DD/YYYY
+        return_date(str): return date of the first trip
+        last_departure_date(str): last departure date, only the first
+            trip if not given
+        step_days(int): days between two departures
+
+    Returns:
+        List of (departure date, return date) pairs
+    '''
+
+    departure = datetime.strptime(departure_date, DATE_FORMAT)
+    stay = datetime.strptime(return_date, DATE_FORMAT) - departure
+    last = (
+        datetime.strptime(last_departure_date, DATE_FORMAT)
+        if last_departure_date else departure)
+
+    windows = []
+
+    while departure <= last:
+        windows.append((
+            departure.strftime(DATE_FORMAT),
+            (departure + stay).strftime(DATE_FORMAT)))
+        departure += timedelta(days=step_days)
+
+    return windows
+
+
+class searchMatrix(object):
+    '''
+        Every search a run makes
+
+    Args:
+        origins(list): departure airport codes, most wanted first
+        destinations(list): arrival airport codes, most wanted first
+        date_windows(list): (departure date, return date) pairs
+        passengers(list): (adults, children) pairs
+        priority(callable): priority(job) -> sort key, lower keys run
+            first. Defaults to the order of the lists above: soonest
+            date window, then origin, destination and passengers
+    '''
+
+    def __init__(
+        self, origins, destinations, date_windows, passengers=((1, 0),),
+        priority=None
+    ):
+
+        self.origins = list(origins)
+        self.destinations = list(destinations)
+        self.date_windows = [tuple(i) for i in date_windows]
+        self.passengers = [tuple(i) for i in passengers]
+        self.priority = priority
+
+    def __len__(self):
+
+        routes = sum(
+            1 for i, j in itertools.product(self.origins, self.destinations)
+            if i != j)
+
+        return routes * len(self.date_windows) * len(self.passengers)
+
+    def _combinations(self):
+
+        for window, origin, destination, passengers in itertools.product(
+            self.date_windows, self.origins, self.destinations,
+            self.passengers
+        ):
+            if origin != destination:
+                yield window, origin, destination, passengers
+
+    def jobs(self):
+        '''
+            Yields one job per search in priority order
+
+            Without a priority function jobs are generated lazily,
+            with one every job is built first to be sorted
+
+        Returns:
+            Generator of job dicts with from, to, departureDate,
+            returnDate, adults, children and priority, the job's rank
+        '''
+
+        jobs = (
+            {
+                'from': origin,
+                'to': destination,
+                'departureDate': window[0],
+                'returnDate': window[1],
+                'adults': passengers[0],
+                'children': passengers[1]
+            }
+            for window, origin, destination, passengers
+            in self._combinations()
+        )
+
+        if self.priority is not None:
+            jobs = sorted(jobs, key=self.priority)
+
+        for rank, job in enumerate(jobs):
+            job['priority'] = rank
+            yield job
+
+    def to_document(self):
+
+        return {
+            'origins': self.origins,
+            'destinations': self.destinations,
+            'dateWindows': [list(i) for i in self.date_windows],
+            'passengers': [list(i) for i in self.passengers]
+        }
+
+    @classmethod
+    def from_document(cls, document):
+
+        return cls(
+            origins=document['origins'],
+            destinations=document['destinations'],
+            date_windows=document['dateWindows'],
+            passengers=document['passengers']
+        )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+'''
+    Precomputes what the dashboard shows for a scrape run so a
+    page view reads one document instead of querying every flight
+'''
+
+import logging
+
+from lib.decorator import connect
+
+SUMMARY_SIZE = 15
+
+
+def best_per_route(flights, match, sort, limit=SUMMARY_SIZE):
+    '''
+        Best offer of every search page by sort, a page holds about
+        25 offers for the same route that would otherwise fill the
+        whole list
+
+    Args:
+        flights(Collection): flights to search
+        match(dict): query the offers have to match
+        sort(list): (field, direction) pairs, the first offer of a
+            page in this order is kept
+        limit(int): offers returned
+
+    Returns:
+        List of flight documents without _id
+    '''
+
+    sort = dict(sort)
+
+    return list(flights.aggregate([
+        {'$match': match},
+        {'$sort': sort},
+        {'$group': {'_id': '$link', 'flight': {'$first': '$$ROOT'}}},
+        {'$replaceRoot': {'newRoot': '$flight'}},
+        {'$sort': sort},
+        {'$limit': limit},
+        {'$project': {'_id': False}}
+    ]))
+
+
+@connect('MONGO')
+def write_run_summary(client, run_time):
+    '''
+        Builds the dashboard summary for a finished run and stores it
+        in scraping.runSummaries keyed by the run time
+
+    Args:
+        run_time(datetime): timePulled of the run's flights
+
+    Returns:
+        The summary document
+    '''
+
+    flights = client.scraping.flights
+    priced = {'timePulled': run_time, 'price': {'$type': 'number'}}
+
+    summary = {
+        '_id': run_time,
+        'timePulled': run_time,
+        'flightCount': flights.estimated_document_count(),
+        'runFlightCount': flights.count_documents({'timePulled': run_time}),
+        'cheapFlights': best_per_route(flights, priced, [('price', 1)]),
+        'bestDeals': best_per_route(
+            flights, dict(priced, pricePerMile={'$type': 'number'}),
+            [('pricePerMile', 1)]),
+        'mapPoints': list(flights.aggregate([
+            {'$match': priced},
+            {'$sort': {'price': 1}},
+            {'$group': {
+                '_id': '$destinationAirportCode',
+                'destinationLatLong': {'$first': '$destinationLatLong'},
+                'price': {'$first': '$price'}
+            }}
+        ]))
+    }
+
+    client.scraping.runSummaries.replace_one(
+        {'_id': run_time}, summary, upsert=True)
+
+    logging.info(
+        'Saved run summary for {run_time}: {number} flights'.format(
+            run_time=run_time, number=summary['runFlightCount']))
+
+    return summary
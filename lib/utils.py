@@ -5,20 +5,10 @@
 '''
 
 import logging
-import asyncio
-import concurrent.futures
-import random
 import math
-import sys
-import requests
-
-import uvloop
-import dryscrape
 
 from lib.decorator import connect
 
-asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-
 
 @connect('MONGO')
 def insert_documents_to_mongo(client, db, collection, docs, overwrite=False):
@@ -61,48 +51,39 @@ def get_proxies_from_mongo(client):
         client.scraping.proxyIps.find({}))][0]
 
 
-def async_load_responses(urls):
+def async_load_responses(urls, proxies=None):
     '''
         Asynchronously loads HTML responses from web pages
 
     Args:
         urls(list): List of urls to generate a response for
-        proxies(list): List of proxies to use to generate a response
+        proxies(list): List of proxies to use to generate a response,
+            pulled from mongo if not given
 
     Returns:
         Dictionary {url: response} for each response that is returned
         as 200
     '''
 
-    proxies = get_proxies_from_mongo()
-
-    def return_response(url, proxy):
-        try:
-            response = requests.get(
-                url, proxies={'https': proxy}, timeout=60)
-            if response.status_code == requests.codes.ok:
-                logging.info(
-                    'Getting response: {url}'.format(url=url) +
-                    ' using proxy: {proxy}'.format(proxy=proxy))
-                return {url: response}
-        except Exception:
-            logging.info('Response with {proxy} timed out!'.format(
-                proxy=proxy))
-
-    async def _gather_tasks(loop, urls, proxies):
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-            tasks = [loop.run_in_executor(
-                executor,
-                return_response,
-                url, random.choice(proxies)) for url in urls
-            ]
-        return await asyncio.gather(*tasks)
+    from lib import loop
+    from lib.fetcher import fetchEngine
+    from lib.proxies import load_proxy_pool, save_proxy_pool
 
-    loop = asyncio.get_event_loop()
-    responses = loop.run_until_complete(_gather_tasks(loop, urls, proxies))
+    pool = load_proxy_pool(proxies)
+
+    async def _gather_responses(urls, pool):
+
+        async with fetchEngine(pool) as engine:
+            return [
+                {url: response}
+                async for url, response in engine.stream(urls)
+                if response is not None
+            ]
 
-    return [i for i in responses if i is not None]
+    try:
+        return loop.run(_gather_responses(urls, pool))
+    finally:
+        save_proxy_pool(pool)
 
 
 def chunk_list(list_, chunk_size):
@@ -125,30 +106,24 @@ def haversine_distance(pointa, pointb, miles=False):
     '''
         Returns the distance between two decimal degrees points
 
+        Single pair wrapper around geo.distances, use that directly
+        for many points at once
+
     Arguments:
         pointa(list): latitude, longitude of point from
         pointb(list): latitude, longitude of point to
         miles(bool): optional to return disrance in miles
 
     Returns:
-        Distance between two points in kilometers or miles
+        Distance between two points in kilometers or miles, None if
+        a coordinate is missing
     '''
 
-    x, y, a, b = pointa[0], pointa[1], pointb[0], pointb[1]
+    from lib import geo
 
-    if x is None or y is None or a is None or b is None:
-        return None
+    distance = float(geo.distances(pointa, pointb, miles=miles))
 
-    if miles:
-        radius = 3959
-    else:
-        radius = 6371
-
-    lat = math.radians(a - x)
-    lon = math.radians(b - y)
-    a = math.sin(lat / 2)**2 + math.cos(
-        math.radians(x)) * math.cos(math.radians(a)) * math.sin(lon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    d = radius * c
+    if math.isnan(distance):
+        return None
 
-    return d
+    return distance
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+'''
+    Shares the urls of a run between worker processes
+
+    The urls saved for a run in scraping.runUrls double as a work
+    queue. A worker claims pending urls one find-and-modify at a
+    time, which marks each one leased to it until a lease expiry.
+    While it works it keeps extending its leases from a heartbeat
+    thread, so the leases of a worker that crashed or lost its
+    connection run out and other workers claim those urls again
+
+    The heartbeats also tell each worker how many workers of the run
+    are alive, and its rate limiter sends the target sites only that
+    share of fetch_rate_limit
+'''
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from configs.config import Configs
+from lib.decorator import connect
+from lib.ratelimit import rateLimiter
+from lib.runs import (
+    DONE, FAILED, LEASED, PENDING, discard_partial_documents
+)
+
+
+def worker_id_for():
+    '''
+        Id unique to this process across machines
+    '''
+
+    return '{host}:{pid}:{token}'.format(
+        host=socket.gethostname(), pid=os.getpid(),
+        token=uuid.uuid4().hex[:8])
+
+
+class workQueue(object):
+    '''
+        Claims a run's urls for one worker
+
+    Args:
+        run_id(str): run whose urls are shared
+        run_time(datetime): timePulled of the run's documents
+        worker_id(str): id leases are taken under
+        claim_size(int): urls claimed at a time
+        lease(float): seconds a claim holds without a heartbeat
+    '''
+
+    def __init__(
+        self, run_id, run_time, worker_id=None, claim_size=None, lease=None
+    ):
+
+        self.run_id = run_id
+        self.run_time = run_time
+        self.worker_id = worker_id or worker_id_for()
+        self.claim_size = claim_size or Configs.worker_claim_size
+        self.lease = lease or Configs.worker_lease
+
+        self.claimed = 0
+        self.reclaimed = 0
+        self.rate_limiter = rateLimiter()
+
+        self._stop_heartbeat = threading.Event()
+        self._heartbeat = None
+
+    def __enter__(self):
+
+        self.start_heartbeat()
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.stop_heartbeat()
+        self.release()
+
+    def _expiry(self):
+
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    @connect('MONGO')
+    def _claim_one(client, self, query):
+
+        return client.scraping.runUrls.find_one_and_update(
+            query,
+            {'$set': {
+                'status': LEASED,
+                'owner': self.worker_id,
+                'leaseExpires': self._expiry()
+            }},
+            sort=[('priority', 1)],
+            projection={'_id': False, 'run': False},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    def claim(self, limit=None):
+        '''
+            Leases up to limit urls, expired leases of other workers
+            first, then pending urls by priority
+
+        Returns:
+            Dictionary {url: route job}, empty once nothing is left
+            to claim
+        '''
+
+        limit = limit or self.claim_size
+        expired = {
+            'run': self.run_id, 'status': LEASED,
+            'leaseExpires': {'$lt': datetime.utcnow()}
+        }
+        pending = {'run': self.run_id, 'status': PENDING}
+
+        jobs = {}
+        reclaimed = []
+
+        for query in (expired, pending):
+
+            while len(jobs) < limit:
+
+                job = self._claim_one(query)
+
+                if job is None:
+                    break
+
+                if job.pop('status') == LEASED:
+                    reclaimed.append(job['url'])
+
+                job.pop('owner', None)
+                job.pop('leaseExpires', None)
+                jobs[job.pop('url')] = job
+
+        if reclaimed:
+            logging.info('Reclaimed {number} expired leases'.format(
+                number=len(reclaimed)))
+            discard_partial_documents(self.run_time, reclaimed)
+
+        self.claimed += len(jobs)
+        self.reclaimed += len(reclaimed)
+
+        return jobs
+
+    async def claimed_jobs(self):
+        '''
+            Yields (url, job) pairs, claiming more as the claimed ones
+            run out, until the queue has nothing left to claim
+
+            Every claim runs on the default executor, and the next
+            claim starts while the urls of the last one are handed
+            out, so mongo round trips never block fetches in flight
+        '''
+
+        loop = asyncio.get_running_loop()
+        claim = loop.run_in_executor(None, self.claim)
+
+        try:
+            while True:
+
+                jobs = await claim
+                claim = None
+
+                if not jobs:
+                    return
+
+                claim = loop.run_in_executor(None, self.claim)
+
+                for url, job in jobs.items():
+                    yield url, job
+        finally:
+            # Let a prefetch in flight finish so release hands back
+            # what it claimed instead of leaving it leased
+            if claim is not None:
+                try:
+                    await claim
+                except Exception:
+                    logging.exception('Prefetched claim failed')
+
+    @connect('MONGO')
+    def heartbeat(client, self):
+        '''
+            Extends every lease this worker holds and splits the fetch
+            rate limit between the workers of the run that sent a
+            heartbeat within the last lease
+
+        Returns:
+            Number of leases extended
+        '''
+
+        now = datetime.utcnow()
+
+        client.scraping.workers.update_one(
+            {'_id': self.worker_id},
+            {'$set': {
+                'run': self.run_id,
+                'heartbeat': now,
+                'claimed': self.claimed
+            }},
+            upsert=True)
+
+        workers = max(client.scraping.workers.count_documents({
+            'run': self.run_id,
+            'heartbeat': {'$gte': now - timedelta(seconds=self.lease)}
+        }), 1)
+
+        if workers != self.rate_limiter.workers:
+            logging.info(
+                '{workers} live workers, sending {rate:g} requests a '
+                'second per site'.format(
+                    workers=workers, rate=self.rate_limiter.limit / workers))
+
+        self.rate_limiter.share(workers)
+
+        return client.scraping.runUrls.update_many(
+            {'run': self.run_id, 'status': LEASED, 'owner': self.worker_id},
+            {'$set': {'leaseExpires': self._expiry()}}).modified_count
+
+    def start_heartbeat(self, interval=None):
+        '''
+            Sends one heartbeat now, so the rate limit is shared
+            before the first request, then more on a background
+            thread, three per lease by default
+        '''
+
+        interval = interval or self.lease / 3
+        self._stop_heartbeat.clear()
+
+        try:
+            self.heartbeat()
+        except Exception:
+            logging.exception('Could not send worker heartbeat')
+
+        def _beat():
+            while not self._stop_heartbeat.wait(interval):
+                try:
+                    self.heartbeat()
+                except Exception:
+                    logging.exception('Could not send worker heartbeat')
+
+        self._heartbeat = threading.Thread(
+            target=_beat, name='workQueue', daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+
+        self._stop_heartbeat.set()
+
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    @connect('MONGO')
+    def release(client, self):
+        '''
+            Hands back the urls this worker claimed but did not finish
+        '''
+
+        released = client.scraping.runUrls.update_many(
+            {'run': self.run_id, 'status': LEASED, 'owner': self.worker_id},
+            {'$set': {'status': PENDING},
+             '$unset': {'owner': '', 'leaseExpires': ''}}).modified_count
+
+        client.scraping.workers.delete_one({'_id': self.worker_id})
+
+        if released:
+            logging.info('Released {number} unfinished urls'.format(
+                number=released))
+
+        return released
+
+    @connect('MONGO')
+    def outstanding(client, self):
+        '''
+            Urls of the run that are pending or leased by any worker
+        '''
+
+        return client.scraping.runUrls.count_documents(
+            {'run': self.run_id, 'status': {'$nin': [DONE, FAILED]}})
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+'''
+    Buffers documents and writes them to mongo in batches
+'''
+
+import logging
+import threading
+import time
+
+from configs.config import Configs
+from lib.decorator import connect
+
+
+class mongoWriter(object):
+    '''
+        Collects documents and flushes them with one unordered
+        insert_many once the buffer holds batch_size documents or
+        its oldest document has waited flush_interval seconds
+
+        Use as a context manager, or call close(), so whatever is
+        left in the buffer is written on shutdown
+
+    Args:
+        db(str): target database
+        collection(str): target collection
+        batch_size(int): documents per insert_many
+        flush_interval(float): max seconds a document waits in the buffer
+        on_flush(callable): on_flush(docs) after each batch is written
+        metrics(runMetrics): records insert times and documents written
+    '''
+
+    def __init__(
+        self, db, collection, batch_size=None, flush_interval=None,
+        on_flush=None, metrics=None
+    ):
+
+        self.db = db
+        self.collection = collection
+        self.batch_size = batch_size or Configs.writer_batch_size
+        self.flush_interval = flush_interval or Configs.writer_flush_interval
+        self.on_flush = on_flush
+        self.metrics = metrics
+
+        self.written = 0
+        self.batches = 0
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_stale, name='mongoWriter', daemon=True)
+        self._flusher.start()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def add(self, docs):
+        '''
+            Adds documents to the buffer, flushing if it is full
+
+        Args:
+            docs(list of dicts): documents to write to mongo
+        '''
+
+        with self._lock:
+
+            if not self._buffer:
+                self._oldest = time.monotonic()
+
+            self._buffer.extend(docs)
+
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        '''
+            Writes everything in the buffer
+
+            If an insert fails the documents not written yet go back
+            to the front of the buffer for the next flush
+
+        Returns:
+            Number of documents written by this flush
+        '''
+
+        with self._lock:
+
+            docs, self._buffer = self._buffer, []
+            oldest, self._oldest = self._oldest, None
+
+            if not docs:
+                return 0
+
+            written = 0
+
+            for i in range(0, len(docs), self.batch_size):
+                try:
+                    written += self._insert(docs[i:i + self.batch_size])
+                except Exception:
+                    self._buffer = docs[i:] + self._buffer
+                    self._oldest = oldest
+                    raise
+
+            return written
+
+    def close(self):
+        '''
+            Stops the background flusher and writes what is left
+        '''
+
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+
+        logging.info(
+            'Wrote {written} documents to mongo {db}.{collection} '
+            'in {batches} batches'.format(
+                written=self.written, db=self.db,
+                collection=self.collection, batches=self.batches))
+
+    def _flush_stale(self):
+
+        while not self._closed.wait(self.flush_interval / 2):
+
+            with self._lock:
+                if self._oldest is not None and (
+                    time.monotonic() - self._oldest >= self.flush_interval
+                ):
+                    # One failed flush must not stop the timed flushes
+                    # for the rest of the run, the documents are kept
+                    try:
+                        self.flush()
+                    except Exception:
+                        logging.exception(
+                            'Timed flush to mongo {db}.{collection} failed, '
+                            '{number} documents kept for the next one'
+                            .format(
+                                db=self.db, collection=self.collection,
+                                number=len(self._buffer)))
+
+    @connect('MONGO')
+    def _insert(client, self, docs):
+
+        from pymongo.errors import BulkWriteError
+
+        start_time = time.monotonic()
+
+        try:
+            written = len(client[self.db][self.collection].insert_many(
+                docs, ordered=False).inserted_ids)
+        except BulkWriteError as error:
+            written = error.details.get('nInserted', 0)
+            logging.error(
+                'Mongo batch insert had {errors} write errors'.format(
+                    errors=len(error.details.get('writeErrors', []))))
+
+        self.written += written
+        self.batches += 1
+
+        if self.metrics is not None:
+            self.metrics.observe('insert', time.monotonic() - start_time)
+            self.metrics.record_written(written)
+
+        logging.info(
+            'Batch {batch}: inserted {written} / {number} documents to '
+            'mongo {db}.{collection}'.format(
+                batch=self.batches, written=written, number=len(docs),
+                db=self.db, collection=self.collection))
+
+        # The documents are written by now, a failing callback is
+        # logged rather than raised so they are not inserted again
+        if self.on_flush is not None:
+            try:
+                self.on_flush(docs)
+            except Exception:
+                logging.exception('on_flush failed after batch {batch}'.format(
+                    batch=self.batches))
+
+        return written